@@ -0,0 +1,18 @@
+from fastapi import Request
+from app.services.ai_service import AIService
+from app.services.vector_service import VectorService
+from app.services.multi_agent_service import AIService as MultiAgentService
+
+# Services are built once at startup (see app.main) and shared by every request
+
+def get_ai_service(request: Request) -> AIService:
+    """Shared embedding/generation service"""
+    return request.app.state.ai_service
+
+def get_vector_service(request: Request) -> VectorService:
+    """Shared Qdrant service"""
+    return request.app.state.vector_service
+
+def get_multi_agent_service(request: Request) -> MultiAgentService:
+    """Shared RAG/web-search answer service"""
+    return request.app.state.multi_agent_service
@@ -1,14 +1,40 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from app.core.database import get_db
+from app.core.database import get_db, User
 from app.core.config import settings
+from app.core.auth import decode_token, invalidate_user_cache
 from datetime import datetime, timedelta, timezone
-from jose import jwt
+import jwt
+from urllib.parse import urlencode
+import asyncio
 import httpx
+import time
+from typing import Optional
 
 router = APIRouter()
 
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+JWKS_CACHE_TTL = 3600  # seconds
+
+# Built once: every parameter comes from settings, which are fixed at startup
+GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth?" + urlencode({
+    "client_id": settings.GOOGLE_CLIENT_ID,
+    "redirect_uri": settings.OAUTH_REDIRECT_URI,
+    "response_type": "code",
+    "scope": "openid email profile",
+    "access_type": "offline",
+    "prompt": "consent",
+})
+
+# Google's JWKS keyed by provider -> (fetched_at, jwks)
+_jwks_cache: dict[str, tuple[float, dict]] = {}
+# Created on first use, inside the running event loop: on Python 3.9 a Lock built at
+# import binds whichever loop is current then, which is not the one uvicorn serves on
+_jwks_lock: Optional[asyncio.Lock] = None
+
 
 class MeResponse(BaseModel):
     email: str
@@ -25,25 +51,34 @@ def create_jwt(payload: dict) -> str:
     return token
 
 
+async def get_google_jwks(client: httpx.AsyncClient) -> dict:
+    """Return Google's signing keys, refetching them at most once per JWKS_CACHE_TTL."""
+    cached = _jwks_cache.get("google")
+    if cached and time.monotonic() - cached[0] < JWKS_CACHE_TTL:
+        return cached[1]
+    global _jwks_lock
+    if _jwks_lock is None:
+        _jwks_lock = asyncio.Lock()
+    async with _jwks_lock:
+        # Another request may have refreshed the keys while we waited
+        cached = _jwks_cache.get("google")
+        if cached and time.monotonic() - cached[0] < JWKS_CACHE_TTL:
+            return cached[1]
+        res = await client.get(GOOGLE_CERTS_URL)
+        res.raise_for_status()
+        jwks = res.json()
+        _jwks_cache["google"] = (time.monotonic(), jwks)
+        return jwks
+
+
 @router.get("/google/login")
 async def google_login():
     """Return Google's OAuth2 authorization URL for client to redirect to."""
-    params = {
-        "client_id": settings.GOOGLE_CLIENT_ID,
-        "redirect_uri": settings.OAUTH_REDIRECT_URI,
-        "response_type": "code",
-        "scope": "openid email profile",
-        "access_type": "offline",
-        "prompt": "consent",
-    }
-    from urllib.parse import urlencode
-
-    url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
-    return {"auth_url": url}
+    return {"auth_url": GOOGLE_AUTH_URL}
 
 
 @router.get("/google/callback")
-async def google_callback(code: str, response: Response, db: Session = Depends(get_db)):
+async def google_callback(code: str, request: Request, db: Session = Depends(get_db)):
     """Handle Google OAuth2 callback, create user if needed, set JWT cookie, redirect to frontend."""
     if not settings.GOOGLE_CLIENT_ID or not settings.GOOGLE_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="Google OAuth not configured")
@@ -57,31 +92,41 @@ async def google_callback(code: str, response: Response, db: Session = Depends(g
         "redirect_uri": settings.OAUTH_REDIRECT_URI,
         "grant_type": "authorization_code",
     }
-    async with httpx.AsyncClient(timeout=15) as client:
-        token_res = await client.post(token_url, data=data)
-        if token_res.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to exchange code for token")
-        token_json = token_res.json()
-
-        id_token = token_json.get("id_token")
-        access_token = token_json.get("access_token")
-        if not id_token and not access_token:
-            raise HTTPException(status_code=400, detail="No token received from Google")
-
-        # Fetch user info
-        userinfo = None
-        if access_token:
-            ures = await client.get(
-                "https://www.googleapis.com/oauth2/v3/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-            if ures.status_code == 200:
-                userinfo = ures.json()
+    client = request.app.state.http_client
+    token_res = await client.post(token_url, data=data)
+    if token_res.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to exchange code for token")
+    token_json = token_res.json()
+
+    id_token = token_json.get("id_token")
+    access_token = token_json.get("access_token")
+    if not id_token and not access_token:
+        raise HTTPException(status_code=400, detail="No token received from Google")
+
+    # Fetch user info
+    userinfo = None
+    if access_token:
+        ures = await client.get(
+            "https://www.googleapis.com/oauth2/v3/userinfo",
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        if ures.status_code == 200:
+            userinfo = ures.json()
 
     if not userinfo and id_token:
-        # Decode id_token locally if needed
+        # Verify id_token locally against Google's cached signing keys
         try:
-            userinfo = jwt.get_unverified_claims(id_token)
+            jwks = await get_google_jwks(client)
+            kid = jwt.get_unverified_header(id_token).get("kid")
+            signing_key = next(key for key in jwks.get("keys", []) if key.get("kid") == kid)
+            userinfo = jwt.decode(
+                id_token,
+                jwt.PyJWK(signing_key).key,
+                algorithms=["RS256"],
+                audience=settings.GOOGLE_CLIENT_ID,
+            )
+            if userinfo.get("iss") not in GOOGLE_ISSUERS:
+                raise ValueError("Unexpected id_token issuer")
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid id_token from Google")
 
@@ -96,7 +141,6 @@ async def google_callback(code: str, response: Response, db: Session = Depends(g
         raise HTTPException(status_code=400, detail="Email not provided by Google")
 
     # Upsert user
-    from app.core.database import User
 
     user = db.query(User).filter(User.email == email).first()
     if user is None:
@@ -117,15 +161,35 @@ async def google_callback(code: str, response: Response, db: Session = Depends(g
         user.avatar_url = picture
         user.provider = "google"
         db.commit()
+    invalidate_user_cache(email)
 
-    # Issue JWT and redirect to frontend with token so frontend can store it
+    # Issue JWT, set it as an HttpOnly cookie and redirect to frontend. The token is
+    # also passed in the URL fragment (never sent to servers, so it stays out of access
+    # logs and Referer headers) for frontends served from a different domain.
     token = create_jwt({"sub": user.user_id, "email": user.email, "name": user.name})
-    redirect_url = f"{settings.FRONTEND_URL}/auth/callback?token={token}"
-    return Response(status_code=307, headers={"Location": redirect_url})
+    redirect = RedirectResponse(url=f"{settings.FRONTEND_URL}/auth/callback#token={token}", status_code=307)
+    redirect.set_cookie(
+        "auth_token",
+        token,
+        httponly=True,
+        secure=settings.FRONTEND_URL.startswith("https://"),
+        samesite="lax",
+        max_age=7 * 24 * 60 * 60,
+        path="/",
+    )
+    return redirect
 
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(request: Request, response: Response):
+    token = request.cookies.get("auth_token")
+    if token:
+        try:
+            email = decode_token(token).get("email")
+            if email:
+                invalidate_user_cache(email)
+        except Exception:
+            pass
     response.delete_cookie("auth_token", path="/")
     return {"success": True}
 
@@ -140,14 +204,13 @@ async def me(request: Request, db: Session = Depends(get_db)):
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = decode_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     email = payload.get("email")
     if not email:
         raise HTTPException(status_code=401, detail="Invalid token payload")
-    from app.core.database import User
     user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, load_only
+from app.core.database import get_db, ChatSession, Message
+from app.core.routing import ORJSONRoute
+from app.core.auth import get_current_principal, invalidate_session_owner
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 class ChatSessionCreate(BaseModel):
     session_id: str
@@ -20,64 +23,83 @@ class ChatSessionResponse(BaseModel):
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
+        orm_mode = True  # Pydantic v1 spelling
+        from_attributes = True  # Pydantic v2 spelling
 
 @router.post("/", response_model=ChatSessionResponse)
 async def create_chat_session(
     session: ChatSessionCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Create a new chat session for the authenticated user"""
-    from app.core.database import ChatSession
     
-    # Check if session already exists for this user
-    existing_session = db.query(ChatSession).filter(
-        ChatSession.session_id == session.session_id,
-        ChatSession.user_id == current_user.user_id
-    ).first()
-    
-    if existing_session:
-        # Update the existing session title if needed
-        if existing_session.title != session.title:
-            existing_session.title = session.title
-            db.commit()
-            db.refresh(existing_session)
-        return existing_session
-    
-    # Create new session if it doesn't exist
-    db_session = ChatSession(
+    # Create the session, or retitle the user's existing one, in a single
+    # INSERT ... ON CONFLICT DO UPDATE ... RETURNING round-trip
+    stmt = pg_insert(ChatSession).values(
         session_id=session.session_id,
         title=session.title,
         user_id=current_user.user_id  # Associate with current user
     )
-    db.add(db_session)
+    stmt = stmt.on_conflict_do_update(
+        # Infer the (session_id, user_id) unique index rather than naming the constraint,
+        # since migrated databases have it as a plain unique index
+        index_elements=[ChatSession.session_id, ChatSession.user_id],
+        set_={
+            "title": stmt.excluded.title,
+            # Only bump updated_at when the title actually changes
+            "updated_at": case(
+                (ChatSession.title != stmt.excluded.title, func.now()),
+                else_=ChatSession.updated_at
+            ),
+        }
+    ).returning(*ChatSession.__table__.columns)
+    
+    row = db.execute(stmt).one()
     db.commit()
-    db.refresh(db_session)
-    return db_session
+    return dict(row._mapping)
 
 @router.get("/", response_model=List[ChatSessionResponse])
 async def get_chat_sessions(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
-    """Get all chat sessions for the authenticated user, ordered by most recently updated first"""
-    from app.core.database import ChatSession
-    # Filter sessions by current user and order by most recently updated first
-    return db.query(ChatSession).filter(
+    """Get a page of chat sessions for the authenticated user, ordered by most recently updated first"""
+    # Filter sessions by current user and order by most recently updated first,
+    # loading only the columns the response exposes
+    return db.query(ChatSession).options(
+        load_only(
+            ChatSession.id,
+            ChatSession.session_id,
+            ChatSession.title,
+            ChatSession.created_at,
+            ChatSession.updated_at,
+        )
+    ).filter(
         ChatSession.user_id == current_user.user_id
-    ).order_by(ChatSession.updated_at.desc(), ChatSession.created_at.desc()).all()
+    ).order_by(
+        ChatSession.updated_at.desc(), ChatSession.created_at.desc()
+    ).offset(skip).limit(limit).all()
 
 @router.get("/{session_id}", response_model=ChatSessionResponse)
 async def get_chat_session(
     session_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Get a specific chat session for the authenticated user"""
-    from app.core.database import ChatSession
-    # Ensure user can only access their own sessions
-    session = db.query(ChatSession).filter(
+    # Ensure user can only access their own sessions, loading only the response's columns
+    session = db.query(ChatSession).options(
+        load_only(
+            ChatSession.id,
+            ChatSession.session_id,
+            ChatSession.title,
+            ChatSession.created_at,
+            ChatSession.updated_at,
+        )
+    ).filter(
         ChatSession.session_id == session_id,
         ChatSession.user_id == current_user.user_id
     ).first()
@@ -89,24 +111,23 @@ async def get_chat_session(
 async def delete_chat_session(
     session_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Delete a chat session for the authenticated user"""
-    from app.core.database import ChatSession, Message
-    # Ensure user can only delete their own sessions
-    session = db.query(ChatSession).filter(
+    # Two bulk DELETEs in one transaction, without loading the session first: the
+    # messages go first (they reference the session), and the session DELETE only
+    # matches the user's own session, so if nothing matched, roll both back
+    db.query(Message).filter(
+        Message.session_id == session_id,
+        Message.user_id == current_user.user_id
+    ).delete(synchronize_session=False)
+    deleted = db.query(ChatSession).filter(
         ChatSession.session_id == session_id,
         ChatSession.user_id == current_user.user_id
-    ).first()
-    if not session:
+    ).delete(synchronize_session=False)
+    if not deleted:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Chat session not found")
-    
-    # Delete associated messages first (cascade should handle this, but being explicit)
-    messages = db.query(Message).filter(Message.session_id == session_id).all()
-    for message in messages:
-        db.delete(message)
-    
-    # Delete the session
-    db.delete(session)
     db.commit()
+    invalidate_session_owner(session_id)
     return {"message": "Chat session deleted successfully"} 
\ No newline at end of file
@@ -1,66 +1,200 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
-from app.models.document import DocumentCreate, DocumentResponse
-from app.services.document_processor import DocumentProcessor
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, load_only
+from app.core.database import get_db, SessionLocal, Document
+from app.api.deps import get_ai_service, get_vector_service
+from app.core.auth import get_current_principal, owns_session
+from app.core.config import settings
+from app.models.document import DocumentCreate, DocumentResponse, DocumentStatusResponse
+from app.services.document_processor import DocumentProcessor, SUPPORTED_EXTENSIONS, SUPPORTED_EXTENSION_LIST
 from app.services.ai_service import AIService
 from app.services.vector_service import VectorService
-import uuid
+import asyncio
+import contextlib
 import os
-from typing import List
+import tempfile
+import time
+from typing import List, Dict, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
+
+# Small fixed buffer for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Built once at import rather than per rejected request
+UNSUPPORTED_FILE_TYPE_DETAIL = f"Unsupported file type. Supported formats: {', '.join(SUPPORTED_EXTENSION_LIST)}"
 document_processor = DocumentProcessor()
-ai_service = AIService()
-vector_service = VectorService()
+
+def _build_metadata(
+    extraction_result: Dict[str, Any],
+    file_size: int,
+    filename: str,
+    file_extension: str,
+    text_content: str,
+    embeddings: List[float],
+    session_id: Optional[str]
+) -> Dict[str, Any]:
+    """Build the metadata stored alongside a processed document"""
+    return {
+        "extraction_method": extraction_result["method"],
+        "file_size": file_size,
+        "filename": filename,
+        "file_extension": file_extension,
+        "text_length": len(text_content),
+        "vector_length": len(embeddings),
+        "session_id": session_id  # NEW: Include session_id in metadata
+    }
+
+def _split_filename(filename: str):
+    """
+    Split filename into (base name, lowercased extension) in one pass,
+    raising 400 if the extension isn't supported
+    """
+    base_name, file_extension = os.path.splitext(filename)
+    file_extension = file_extension.lower()
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=UNSUPPORTED_FILE_TYPE_DETAIL
+        )
+    return base_name, file_extension
+
+def _validate_session(db: Session, session_id: Optional[str], user_id: str):
+    """Raise 400 if session_id is given but doesn't belong to the user"""
+    if not session_id:
+        return
+    if not owns_session(db, session_id, user_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid session_id or access denied"
+        )
+
+def _save_upload_to_tempfile(file: UploadFile, file_extension: str):
+    """
+    Stream an upload to a uniquely named temp file and return (path, size).
+    Streaming in chunks avoids buffering the body in memory; the unique name keeps
+    concurrent uploads of the same filename apart and keeps the client filename
+    out of the path. Blocking file I/O, so call it via run_in_threadpool.
+    Raises 413 as soon as more than MAX_FILE_SIZE bytes have been copied, which
+    also bounds uploads that arrive without a Content-Length.
+    The caller is responsible for removing the file.
+    """
+    file_size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp:
+        temp_path = tmp.name
+        while True:
+            chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            if file_size > settings.MAX_FILE_SIZE:
+                break
+            tmp.write(chunk)
+    if file_size > settings.MAX_FILE_SIZE:
+        _remove_tempfile(temp_path)
+        raise HTTPException(
+            status_code=413,
+            detail=f"{file.filename} is larger than the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB upload limit"
+        )
+    return temp_path, file_size
+
+def _remove_tempfile(temp_path: str):
+    """Delete a temp file if it is still there (a single unlink, no exists() check first)"""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(temp_path)
+
+async def _process_document_task(
+    document_id: str,
+    temp_path: str,
+    file_extension: str,
+    ai_service: AIService,
+    vector_service: VectorService
+):
+    """Extract, embed and index a document that was accepted by /upload-async"""
+    
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.document_id == document_id).first()
+        if not document:
+            logger.warning(f"Document {document_id} disappeared before processing")
+            return
+        
+        extraction_result = await document_processor.extract_text_async(temp_path, file_extension)
+        if not extraction_result["success"]:
+            document.status = "failed"
+            document.metadata_json = {"error": extraction_result.get("error", "Unknown error")}
+            db.commit()
+            return
+        
+        text_content = extraction_result["text"]
+        embeddings = await ai_service.create_embeddings(text_content)
+        
+        document.text_content = text_content
+        document.text_length = len(text_content)
+        document.metadata_json = _build_metadata(
+            extraction_result, document.file_size, document.filename, file_extension,
+            text_content, embeddings, document.session_id
+        )
+        document.status = "completed"
+        db.commit()
+        
+        try:
+            await vector_service.store_document_async(
+                document_id=document_id,
+                text=text_content,
+                embeddings=embeddings,
+                metadata={
+                    **document.metadata_json,
+                    "user_id": document.user_id,
+                    "upload_date": document.upload_date.isoformat(),
+                    "filename": document.filename,
+                    "session_id": document.session_id
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Vector storage failed: {str(e)}")
+            # Still searchable by keyword from Postgres, so earlier answers may be stale
+            await run_in_threadpool(vector_service.invalidate_cached_responses, [document.user_id])
+    except Exception as e:
+        logger.error(f"Background processing failed for {document_id}: {str(e)}")
+        db.rollback()
+        # Plain UPDATE; no need to load the row (and its text) back just to flag it
+        db.query(Document).filter(Document.document_id == document_id).update(
+            {Document.status: "failed", Document.metadata_json: {"error": str(e)}},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+        _remove_tempfile(temp_path)
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
     file: UploadFile = File(...),
     session_id: str = Form(None),  # NEW: Accept session_id from form
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    ai_service: AIService = Depends(get_ai_service),
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Upload and process a document for the authenticated user"""
     try:
         # Validate file type
-        supported_extensions = ['.pdf', '.docx', '.doc', '.txt', '.md', '.mdx', '.rtf']
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in supported_extensions:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file type. Supported formats: {', '.join(supported_extensions)}"
-            )
+        base_name, file_extension = _split_filename(file.filename)
         
         # Validate session_id if provided
-        if session_id:
-            from app.core.database import ChatSession
-            chat_session = db.query(ChatSession).filter(
-                ChatSession.session_id == session_id,
-                ChatSession.user_id == current_user.user_id
-            ).first()
-            if not chat_session:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid session_id or access denied"
-                )
-        
-        # Read file content
-        content = await file.read()
+        _validate_session(db, session_id, current_user.user_id)
         
-        # Save file temporarily for OCR processing
-        temp_path = f"/tmp/{file.filename}"
-        with open(temp_path, "wb") as f:
-            f.write(content)
+        temp_path, file_size = await run_in_threadpool(_save_upload_to_tempfile, file, file_extension)
         
         try:
             # Extract text from document
-            file_extension = os.path.splitext(file.filename)[1].lower()
-            extraction_result = document_processor.extract_text(temp_path, content, file_extension)
+            # Parsing runs in a worker process so large files don't stall the event loop
+            extraction_result = await document_processor.extract_text_async(temp_path, file_extension)
             
             if not extraction_result["success"]:
                 raise HTTPException(
@@ -74,57 +208,45 @@ async def upload_document(
             embeddings = await ai_service.create_embeddings(text_content)
             
             # Generate document ID
-            import time
-            document_id = f"{os.path.splitext(file.filename)[0]}_{int(time.time() * 1000)}"
+            document_id = f"{base_name}_{int(time.time() * 1000)}"
             
             # Save to database
-            file_extension = os.path.splitext(file.filename)[1].lower()
             db_document = DocumentCreate(
                 document_id=document_id,
                 filename=file.filename,
                 file_type=file_extension[1:],  # Remove the dot
-                file_size=len(content),
+                file_size=file_size,
                 text_content=text_content,
                 text_length=len(text_content),
-                metadata_json={
-                    "extraction_method": extraction_result["method"],
-                    "file_size": len(content),
-                    "filename": file.filename,
-                    "file_extension": file_extension,
-                    "text_length": len(text_content),
-                    "vector_length": len(embeddings),
-                    "session_id": session_id  # NEW: Include session_id in metadata
-                }
+                metadata_json=_build_metadata(
+                    extraction_result, file_size, file.filename, file_extension,
+                    text_content, embeddings, session_id
+                )
             )
             
             # Save to PostgreSQL with user association
-            from app.core.database import Document
-            document = Document(
-                document_id=db_document.document_id,
-                filename=db_document.filename,
-                file_type=db_document.file_type,
-                file_size=db_document.file_size,
-                text_content=db_document.text_content,
-                text_length=db_document.text_length,
-                metadata_json=db_document.metadata_json,
-                user_id=current_user.user_id,  # Associate with current user
-                session_id=session_id  # NEW: Associate with chat session
-            )
-            db.add(document)
+            # Core INSERT ... RETURNING hands back the generated id and upload_date
+            # in the same round-trip, with no ORM instance to track or refresh
+            document_pk, upload_date = db.execute(
+                insert(Document).values(
+                    **db_document.dict(),
+                    user_id=current_user.user_id,  # Associate with current user
+                    session_id=session_id  # NEW: Associate with chat session
+                ).returning(Document.id, Document.upload_date)
+            ).one()
             db.commit()
-            db.refresh(document)
             
             # Save to vector database with user context
             try:
-                vector_service.store_document(
+                await vector_service.store_document_async(
                     document_id=document_id,
                     text=text_content,
                     embeddings=embeddings,
                     metadata={
                         **db_document.metadata_json,
                         "user_id": current_user.user_id,  # Include user ID in metadata
-                        "upload_date": document.upload_date.isoformat(),  # Include upload timestamp
-                        "filename": document.filename,  # Include filename for better identification
+                        "upload_date": upload_date.isoformat(),  # Include upload timestamp
+                        "filename": db_document.filename,  # Include filename for better identification
                         "session_id": session_id  # NEW: Include session_id in metadata
                     }
                 )
@@ -132,15 +254,19 @@ async def upload_document(
             except Exception as e:
                 logger.warning(f"Vector storage failed: {str(e)}")
                 vector_storage_method = "postgresql_only"
+                # Still searchable by keyword from Postgres, so earlier answers may be stale
+                await run_in_threadpool(vector_service.invalidate_cached_responses, [current_user.user_id])
             
-            return DocumentResponse(
-                id=document.id,
-                document_id=document.document_id,
-                filename=document.filename,
-                file_type=document.file_type,
-                file_size=document.file_size,
-                text_length=document.text_length,
-                upload_date=document.upload_date,
+            # Plain dict: response_model validates it once, instead of validating
+            # a DocumentResponse here and then again during serialization
+            return dict(
+                id=document_pk,
+                document_id=db_document.document_id,
+                filename=db_document.filename,
+                file_type=db_document.file_type,
+                file_size=db_document.file_size,
+                text_length=db_document.text_length,
+                upload_date=upload_date,
                 extraction_method=extraction_result["method"],
                 vector_storage_method=vector_storage_method,
                 success=True
@@ -148,89 +274,269 @@ async def upload_document(
             
         finally:
             # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            _remove_tempfile(temp_path)
                 
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk", response_model=List[DocumentResponse])
+async def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    session_id: str = Form(None),
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
+):
+    """Upload and process several documents, inserting all rows in one statement"""
+    
+    # Validate everything up front so a bad file doesn't leave a partial batch
+    split_names = [_split_filename(f.filename) for f in files]
+    _validate_session(db, session_id, current_user.user_id)
+    
+    items = []
+    temp_paths = []
+    try:
+        file_sizes = []
+        for file, (_, file_extension) in zip(files, split_names):
+            temp_path, file_size = await run_in_threadpool(_save_upload_to_tempfile, file, file_extension)
+            temp_paths.append(temp_path)
+            file_sizes.append(file_size)
+        
+        # Parse every file concurrently, each in its own worker process
+        extraction_results = await asyncio.gather(*(
+            document_processor.extract_text_async(temp_path, file_extension)
+            for temp_path, (_, file_extension) in zip(temp_paths, split_names)
+        ))
+        for file, extraction_result in zip(files, extraction_results):
+            if not extraction_result["success"]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Failed to extract text from {file.filename}: {extraction_result.get('error', 'Unknown error')}"
+                )
+        
+        # Batched embedding requests for the whole upload instead of one per file
+        texts = [extraction_result["text"] for extraction_result in extraction_results]
+        batch_embeddings = await ai_service.create_embeddings_batch(texts)
+        
+        for index, (file, (base_name, file_extension), file_size, extraction_result, text_content, embeddings) in enumerate(
+            zip(files, split_names, file_sizes, extraction_results, texts, batch_embeddings)
+        ):
+            items.append({
+                "document_id": f"{base_name}_{int(time.time() * 1000)}_{index}",
+                "filename": file.filename,
+                "file_type": file_extension[1:],
+                "file_size": file_size,
+                "text_content": text_content,
+                "text_length": len(text_content),
+                "metadata_json": _build_metadata(
+                    extraction_result, file_size, file.filename, file_extension,
+                    text_content, embeddings, session_id
+                ),
+                "extraction_method": extraction_result["method"],
+                "embeddings": embeddings
+            })
+        
+        # One multi-row INSERT ... RETURNING for the whole batch
+        rows = db.execute(
+            insert(Document).values([
+                {
+                    "document_id": item["document_id"],
+                    "filename": item["filename"],
+                    "file_type": item["file_type"],
+                    "file_size": item["file_size"],
+                    "text_content": item["text_content"],
+                    "text_length": item["text_length"],
+                    "metadata_json": item["metadata_json"],
+                    "user_id": current_user.user_id,
+                    "session_id": session_id
+                }
+                for item in items
+            ]).returning(Document.document_id, Document.id, Document.upload_date)
+        ).all()
+        # RETURNING order isn't guaranteed, so match rows back by document_id
+        generated = {row.document_id: (row.id, row.upload_date) for row in rows}
+        for item in items:
+            item["id"], item["upload_date"] = generated[item["document_id"]]
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Bulk upload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for temp_path in temp_paths:
+            _remove_tempfile(temp_path)
+    
+    # Every point in the batch goes to Qdrant in one upsert
+    try:
+        await run_in_threadpool(vector_service.store_documents, [
+            {
+                "document_id": item["document_id"],
+                "text": item["text_content"],
+                "embeddings": item["embeddings"],
+                "metadata": {
+                    **item["metadata_json"],
+                    "user_id": current_user.user_id,
+                    "upload_date": item["upload_date"].isoformat(),
+                    "filename": item["filename"],
+                    "session_id": session_id
+                }
+            }
+            for item in items
+        ])
+        vector_storage_method = "qdrant"
+    except Exception as e:
+        logger.warning(f"Vector storage failed: {str(e)}")
+        vector_storage_method = "postgresql_only"
+        # Still searchable by keyword from Postgres, so earlier answers may be stale
+        await run_in_threadpool(vector_service.invalidate_cached_responses, [current_user.user_id])
+    
+    results = []
+    for item in items:
+        results.append(dict(
+            id=item["id"],
+            document_id=item["document_id"],
+            filename=item["filename"],
+            file_type=item["file_type"],
+            file_size=item["file_size"],
+            text_length=item["text_length"],
+            upload_date=item["upload_date"],
+            extraction_method=item["extraction_method"],
+            vector_storage_method=vector_storage_method,
+            success=True
+        ))
+    return results
+
+@router.post("/upload-async", response_model=DocumentResponse)
+async def upload_document_async(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    session_id: str = Form(None),
+    db: Session = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
+):
+    """
+    Accept a document and process it in the background.
+    Returns immediately with status "processing"; poll /{document_id}/status for the result.
+    """
+    
+    base_name, file_extension = _split_filename(file.filename)
+    _validate_session(db, session_id, current_user.user_id)
+    temp_path, file_size = await run_in_threadpool(_save_upload_to_tempfile, file, file_extension)
+    
+    try:
+        document_id = f"{base_name}_{int(time.time() * 1000)}"
+        # Same Core INSERT ... RETURNING as /upload: the generated id and upload_date
+        # come back in one round-trip
+        document_pk, upload_date = db.execute(
+            insert(Document).values(
+                document_id=document_id,
+                filename=file.filename,
+                file_type=file_extension[1:],
+                file_size=file_size,
+                user_id=current_user.user_id,
+                session_id=session_id,
+                status="processing"
+            ).returning(Document.id, Document.upload_date)
+        ).one()
+        db.commit()
     except Exception as e:
+        _remove_tempfile(temp_path)
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # The task owns temp_path from here on and removes it when done
+    background_tasks.add_task(
+        _process_document_task, document_id, temp_path, file_extension, ai_service, vector_service
+    )
+    
+    return dict(
+        id=document_pk,
+        document_id=document_id,
+        filename=file.filename,
+        file_type=file_extension[1:],
+        file_size=file_size,
+        upload_date=upload_date,
+        status="processing",
+        success=True
+    )
 
 @router.get("/", response_model=List[DocumentResponse])
 async def get_documents(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
-    """Get all documents for the authenticated user"""
-    from app.core.database import Document
-    # Filter documents by current user
-    documents = db.query(Document).filter(Document.user_id == current_user.user_id).all()
+    """Get a page of documents for the authenticated user"""
+    # Filter documents by current user; order by id so pages are stable
+    documents = db.query(Document).filter(
+        Document.user_id == current_user.user_id
+    ).order_by(Document.id).offset(skip).limit(limit).all()
     return documents
 
 @router.delete("/clear-all")
 async def clear_all_documents(
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Delete all documents for the authenticated user"""
-    from app.core.database import Document
-    
-    logger.info(f"🗑️ Starting document cleanup for user {current_user.user_id}")
+    user_id = current_user.user_id
+    summary = {"vector": "user_filter", "old_format": "cleared"}
     
     # Step 1: Clear from vector database first (more aggressive approach)
     try:
-        logger.info(f"🔍 Clearing vector database for user {current_user.user_id}")
-        vector_service.clear_user_documents(current_user.user_id)
-        logger.info(f"✅ Vector database cleared for user {current_user.user_id}")
+        vector_service.clear_user_documents(user_id)
     except Exception as e:
-        logger.warning(f"⚠️ Vector clear user documents failed: {str(e)}")
+        logger.warning("Vector clear user documents failed for user %s: %s", user_id, e)
         # Try alternative method - clear all documents from vector database
         try:
-            logger.info("🔄 Trying alternative vector clearing method...")
             vector_service.clear_all_documents()
-            logger.info("✅ Alternative vector clearing successful")
+            summary["vector"] = "clear_all_fallback"
         except Exception as e2:
-            logger.error(f"❌ Alternative vector clearing also failed: {str(e2)}")
+            logger.error("Alternative vector clearing also failed: %s", e2)
+            summary["vector"] = "failed"
     
     # Step 2: Clear old format documents from vector database
     try:
-        logger.info("🔍 Clearing old format documents from vector database...")
         vector_service.clear_documents_without_upload_date()
-        logger.info("✅ Old format documents cleared from vector database")
     except Exception as e:
-        logger.warning(f"⚠️ Old format document clearing failed: {str(e)}")
+        logger.warning("Old format document clearing failed: %s", e)
+        summary["old_format"] = "failed"
+    
+    # Whichever vector path ran, cached answers may cite the deleted documents
+    vector_service.invalidate_cached_responses([user_id])
     
-    # Step 3: Clear from PostgreSQL
+    # Step 3: Clear from PostgreSQL with a single bulk DELETE; its row count is
+    # authoritative, so no follow-up COUNT is needed to verify it
     try:
-        # Only get documents belonging to current user
-        documents = db.query(Document).filter(Document.user_id == current_user.user_id).all()
-        document_count = len(documents)
-        logger.info(f"📄 Found {document_count} documents in PostgreSQL for user {current_user.user_id}")
-        
-        # Delete from PostgreSQL
-        for document in documents:
-            db.delete(document)
+        document_count = db.query(Document).filter(
+            Document.user_id == user_id
+        ).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"✅ Deleted {document_count} documents from PostgreSQL for user {current_user.user_id}")
-        
-        # Verify deletion
-        remaining_docs = db.query(Document).filter(Document.user_id == current_user.user_id).count()
-        if remaining_docs > 0:
-            logger.warning(f"⚠️ {remaining_docs} documents still remain in PostgreSQL for user {current_user.user_id}")
-        else:
-            logger.info(f"✅ Verified: No documents remain in PostgreSQL for user {current_user.user_id}")
-            
     except Exception as e:
-        logger.error(f"❌ PostgreSQL document deletion failed: {str(e)}")
+        logger.error("PostgreSQL document deletion failed for user %s: %s", user_id, e)
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete documents from database: {str(e)}")
     
-    logger.info(f"✅ Complete document cleanup finished for user {current_user.user_id}")
+    summary["postgres_deleted"] = document_count
+    logger.info("Document cleanup finished for user %s: %s", user_id, summary)
     return {"message": f"Deleted {document_count} documents for the current user"}
 
 @router.delete("/clear-old-format")
 async def clear_old_format_documents(
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Clear documents without upload_date metadata (for backward compatibility)"""
     try:
@@ -242,14 +548,37 @@ async def clear_old_format_documents(
         logger.error(f"Failed to clear old format documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: str,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_principal)  # Require authentication
+):
+    """Get the processing status of a document for the authenticated user"""
+    # Polled while processing; load only what the status needs, never text_content
+    document = db.query(Document).options(
+        load_only(Document.document_id, Document.status, Document.text_length, Document.metadata_json)
+    ).filter(
+        Document.document_id == document_id,
+        Document.user_id == current_user.user_id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    error = document.metadata_json.get("error") if document.status == "failed" and document.metadata_json else None
+    return DocumentStatusResponse(
+        document_id=document.document_id,
+        status=document.status,
+        text_length=document.text_length,
+        error=error
+    )
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Get a specific document for the authenticated user"""
-    from app.core.database import Document
     # Ensure user can only access their own documents
     document = db.query(Document).filter(
         Document.document_id == document_id,
@@ -263,24 +592,23 @@ async def get_document(
 async def delete_document(
     document_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    vector_service: VectorService = Depends(get_vector_service),
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Delete a document for the authenticated user"""
-    from app.core.database import Document
-    # Ensure user can only delete their own documents
-    document = db.query(Document).filter(
+    # Ensure user can only delete their own documents; a bulk DELETE skips loading the row
+    deleted = db.query(Document).filter(
         Document.document_id == document_id,
         Document.user_id == current_user.user_id
-    ).first()
-    if not document:
+    ).delete(synchronize_session=False)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Document not found")
-    
-    db.delete(document)
     db.commit()
     
-    # Also delete from vector database
+    # Also delete from vector database, and drop answers that may cite this document
     try:
         vector_service.delete_document(document_id)
+        vector_service.invalidate_cached_responses([current_user.user_id])
     except Exception as e:
         logger.warning(f"Vector deletion failed: {str(e)}")
     
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import JSON, func, insert, literal, select, update
+from sqlalchemy.orm import Session, load_only
+from app.core.database import get_db, Message, ChatSession
+from app.core.routing import ORJSONRoute
+from app.core.auth import get_current_principal, owns_session
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import uuid
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 class MessageCreate(BaseModel):
     session_id: str
@@ -27,84 +29,112 @@ class MessageResponse(BaseModel):
     timestamp: datetime
 
     class Config:
-        from_attributes = True
+        orm_mode = True  # Pydantic v1 spelling
+        from_attributes = True  # Pydantic v2 spelling
 
 @router.post("/", response_model=MessageResponse)
 async def create_message(
     message: MessageCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Create a new message for the authenticated user"""
-    from app.core.database import Message, ChatSession
     
     # Validate message type
     if message.type not in ["user", "assistant"]:
         raise HTTPException(status_code=400, detail="Type must be 'user' or 'assistant'")
     
-    # Verify the session belongs to the current user
-    session = db.query(ChatSession).filter(
-        ChatSession.session_id == message.session_id,
-        ChatSession.user_id == current_user.user_id
-    ).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Chat session not found or access denied")
-    
     # Generate message ID
     message_id = str(uuid.uuid4())
     
-    db_message = Message(
-        message_id=message_id,
-        session_id=message.session_id,
-        type=message.type,
-        content=message.content,
-        sources=message.sources or [],
-        metadata_json=message.metadata_json or {},
-        user_id=current_user.user_id  # Associate with current user
-    )
-    
-    db.add(db_message)
-    
-    # Update the chat session's updated_at timestamp when a new message is added
-    session.updated_at = datetime.utcnow()
+    # Bump the session's updated_at, but only if it belongs to the current user;
+    # the CTE yields no row otherwise, so the INSERT below inserts nothing
+    touched_session = update(ChatSession).where(
+        ChatSession.session_id == message.session_id,
+        ChatSession.user_id == current_user.user_id
+    ).values(updated_at=func.now()).returning(ChatSession.session_id).cte("touched_session")
+    
+    # Ownership check, message INSERT and session UPDATE in one round-trip
+    stmt = insert(Message).from_select(
+        ["message_id", "session_id", "type", "content", "sources", "metadata_json", "user_id"],
+        select(
+            literal(message_id),
+            touched_session.c.session_id,
+            literal(message.type),
+            literal(message.content),
+            literal(message.sources or [], JSON),
+            literal(message.metadata_json or {}, JSON),
+            literal(current_user.user_id)  # Associate with current user
+        )
+    ).add_cte(touched_session).returning(*Message.__table__.columns)
+    
+    row = db.execute(stmt).first()
+    if not row:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Chat session not found or access denied")
     
     db.commit()
-    db.refresh(db_message)
     
-    return db_message
+    return dict(row._mapping)
 
 @router.get("/", response_model=List[MessageResponse])
 async def get_messages(
     session_id: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    # Chat history is read oldest-first, so the default page covers a whole typical session
+    limit: int = Query(1000, ge=1, le=5000),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Get messages for the authenticated user, optionally filtered by session_id"""
-    from app.core.database import Message, ChatSession
     
-    query = db.query(Message).filter(Message.user_id == current_user.user_id)
+    # Load only the columns the response exposes
+    query = db.query(Message).options(
+        load_only(
+            Message.id,
+            Message.message_id,
+            Message.session_id,
+            Message.type,
+            Message.content,
+            Message.sources,
+            Message.metadata_json,
+            Message.timestamp,
+        )
+    ).filter(Message.user_id == current_user.user_id)
     
     if session_id:
         # Verify the session belongs to the current user
-        session = db.query(ChatSession).filter(
-            ChatSession.session_id == session_id,
-            ChatSession.user_id == current_user.user_id
-        ).first()
-        if not session:
+        if not owns_session(db, session_id, current_user.user_id):
             raise HTTPException(status_code=404, detail="Chat session not found or access denied")
         query = query.filter(Message.session_id == session_id)
     
-    messages = query.order_by(Message.timestamp.asc()).all()
+    messages = query.order_by(Message.timestamp.asc()).offset(skip).limit(limit).all()
     return messages
 
+# Declared before the /{message_id} routes, which would otherwise capture "clear-all"
+@router.delete("/clear-all")
+async def clear_all_messages(
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_principal)  # Require authentication
+):
+    """Delete all messages for the authenticated user"""
+    
+    # Only delete messages belonging to current user, with a single bulk DELETE
+    message_count = db.query(Message).filter(
+        Message.user_id == current_user.user_id
+    ).delete(synchronize_session=False)
+    
+    db.commit()
+    
+    return {"message": f"Deleted {message_count} messages for the current user"}
+
 @router.get("/{message_id}", response_model=MessageResponse)
 async def get_message(
     message_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Get a specific message for the authenticated user"""
-    from app.core.database import Message
     
     # Ensure user can only access their own messages
     message = db.query(Message).filter(
@@ -120,20 +150,18 @@ async def get_message(
 async def delete_message(
     message_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Delete a message for the authenticated user"""
-    from app.core.database import Message
     
-    # Ensure user can only delete their own messages
-    message = db.query(Message).filter(
+    # Ensure user can only delete their own messages; a single DELETE, whose row count
+    # tells whether there was one
+    deleted = db.query(Message).filter(
         Message.message_id == message_id,
         Message.user_id == current_user.user_id
-    ).first()
-    if not message:
+    ).delete(synchronize_session=False)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Message not found")
-    
-    db.delete(message)
     db.commit()
     
     return {"message": "Message deleted successfully"}
@@ -142,44 +170,19 @@ async def delete_message(
 async def delete_session_messages(
     session_id: str, 
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Delete all messages for a session belonging to the authenticated user"""
-    from app.core.database import Message, ChatSession
     
     # Verify the session belongs to the current user
-    session = db.query(ChatSession).filter(
-        ChatSession.session_id == session_id,
-        ChatSession.user_id == current_user.user_id
-    ).first()
-    if not session:
+    if not owns_session(db, session_id, current_user.user_id):
         raise HTTPException(status_code=404, detail="Chat session not found or access denied")
     
-    # Delete messages for this session (they should all belong to the user)
-    messages = db.query(Message).filter(Message.session_id == session_id).all()
-    
-    for message in messages:
-        db.delete(message)
-    
-    db.commit()
-    
-    return {"message": f"Deleted {len(messages)} messages for session {session_id}"}
-
-@router.delete("/clear-all")
-async def clear_all_messages(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
-):
-    """Delete all messages for the authenticated user"""
-    from app.core.database import Message
-    
-    # Only delete messages belonging to current user
-    messages = db.query(Message).filter(Message.user_id == current_user.user_id).all()
-    message_count = len(messages)
-    
-    for message in messages:
-        db.delete(message)
+    # Delete messages for this session (they should all belong to the user) with a single bulk DELETE
+    message_count = db.query(Message).filter(
+        Message.session_id == session_id
+    ).delete(synchronize_session=False)
     
     db.commit()
     
-    return {"message": f"Deleted {message_count} messages for the current user"} 
\ No newline at end of file
+    return {"message": f"Deleted {message_count} messages for session {session_id}"}
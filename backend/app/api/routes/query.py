@@ -1,22 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.auth import get_current_user
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db, ChatSession, Document
+from app.core.routing import ORJSONRoute
+from app.api.deps import get_ai_service, get_vector_service, get_multi_agent_service
+from app.core.auth import get_current_principal
 from app.services.ai_service import AIService
 from app.services.vector_service import VectorService
-from app.services.multi_agent_service import AIService as MultiAgentService
-from app.models.document import get_all_documents, get_documents_by_session
+from app.services.multi_agent_service import AIService as MultiAgentService, MAX_CONTEXT_LENGTH, CONTEXT_TRUNCATED_NOTE
+from app.models.document import search_documents_fulltext_async
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+import asyncio
+import hashlib
+import io
 import logging
+import orjson
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
-ai_service = AIService()
-vector_service = VectorService()
-multi_agent_service = MultiAgentService()
+router = APIRouter(route_class=ORJSONRoute)
+
+# Vector hits fetched per query. Scope and upload-time filters run inside Qdrant, so every
+# hit is usable, and the prompt's context budget rarely has room for more than a few documents
+VECTOR_SEARCH_LIMIT = 5
+# Hits below this similarity are dropped by Qdrant rather than shipped back and put in the
+# prompt; a search left empty falls through to full-text search
+VECTOR_SCORE_THRESHOLD = 0.1
+
+# The single general-purpose assistant; static, so /domains returns it as built here
+AVAILABLE_ASSISTANTS = {
+    "assistants": [
+        {
+            "id": "general",
+            "name": "AI Assistant",
+            "description": "General purpose AI assistant for document analysis and web search"
+        }
+    ]
+}
 
 class QueryRequest(BaseModel):
     question: str
@@ -36,245 +60,412 @@ class QueryResponse(BaseModel):
     web_search_used: bool = False
     model_used: str
 
+def _fulltext_result(row) -> Dict[str, Any]:
+    """Shape a full-text search row like the other search results"""
+    return {
+        'id': row.id,
+        'filename': row.filename,
+        'content': row.text_content,
+        'relevance_score': row.rank,
+        'metadata': {
+            'upload_date': row.upload_date.isoformat(),
+            'user_id': row.user_id,
+            'session_id': row.session_id
+        }
+    }
+
+async def _get_query_scope(db: AsyncSession, session_id: Optional[str], user_id: str) -> Tuple[Optional[datetime], int]:
+    """
+    Creation time of the user's chat session (None if there is no such session) and the
+    number of documents the user has, in one round trip
+    """
+    document_count = select(func.count()).select_from(Document).where(
+        Document.user_id == user_id
+    ).scalar_subquery()
+    if not session_id:
+        return None, (await db.execute(select(document_count))).scalar_one()
+    # Ensure the chat session belongs to the current user
+    created_at = select(ChatSession.created_at).where(
+        ChatSession.session_id == session_id,
+        ChatSession.user_id == user_id
+    ).scalar_subquery()
+    chat_creation_time, user_document_count = (await db.execute(select(created_at, document_count))).one()
+    return chat_creation_time, user_document_count
+
+async def _vector_search(
+    vector_service: VectorService,
+    query_embeddings: List[float],
+    user_id: str,
+    session_id: Optional[str],
+    chat_creation_time: Optional[datetime]
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Vector search scoped to the session (falling back to all of the user's documents); returns (results, search method)"""
+    search_results = []
+    search_method = "fallback"
+    
+    # Try vector search first
+    if vector_service.is_available():
+        try:
+            # Use session-based search if session_id is provided
+            if session_id:
+                # Session and user-wide searches go to Qdrant as one batch, so falling
+                # back to the user's other documents costs no extra round trip
+                session_results, user_results = await run_in_threadpool(
+                    vector_service.search_documents_with_session_fallback,
+                    query_embeddings,
+                    user_id,
+                    session_id,
+                    limit=VECTOR_SEARCH_LIMIT,
+                    uploaded_after=chat_creation_time,
+                    score_threshold=VECTOR_SCORE_THRESHOLD
+                )
+                logger.debug("🔍 Session-based vector search returned %d results for user %s, session %s", len(session_results), user_id, session_id)
+                
+                # If no session-specific results, fall back to user-based search
+                if not session_results:
+                    logger.debug("🔄 No session-specific documents found, falling back to user-based search")
+                    vector_results = user_results
+                    logger.debug("🔍 User-based vector search returned %d results for user %s", len(vector_results), user_id)
+                    search_method = "user_vector_search_fallback"
+                else:
+                    vector_results = session_results
+                    search_method = "session_vector_search"
+            else:
+                # Fallback to user-based search if no session_id
+                vector_results = await run_in_threadpool(
+                    vector_service.search_documents_with_user_filter,
+                    query_embeddings, 
+                    user_id,
+                    limit=VECTOR_SEARCH_LIMIT,
+                    score_threshold=VECTOR_SCORE_THRESHOLD
+                )
+                logger.debug("🔍 User-based vector search returned %d results for user %s", len(vector_results), user_id)
+                search_method = "user_vector_search"
+            
+            if vector_results:
+                search_results = vector_results
+                logger.debug("✅ Vector search successful: %d results", len(search_results))
+            else:
+                logger.warning("❌ Vector search returned no results")
+        except Exception as e:
+            logger.error(f"❌ Vector search failed: {str(e)}")
+    
+    return search_results, search_method
+
+def _build_context(search_results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Build the prompt context and the response sources in one pass over the search hits.
+    Context is written straight into the prompt's budget: an oversized payload is cut as
+    it is added rather than joined in full and sliced, and later hits only add sources.
+    """
+    context_buffer = io.StringIO()
+    remaining = MAX_CONTEXT_LENGTH
+    truncated = False
+    sources = []
+    
+    for i, result in enumerate(search_results):
+        try:
+            # Handle different result structures
+            if 'payload' in result:
+                # Vector search result structure
+                payload = result.get('payload', {})
+                filename = payload.get('filename', f'Document {i+1}')
+                content = payload.get('text', '')
+                relevance = result.get('score', 'Unknown')
+            else:
+                # Full-text search result structure
+                filename = result.get('filename', f'Document {i+1}')
+                content = result.get('content', '')
+                relevance = result.get('relevance_score', 'Unknown')
+            
+            # Add to context
+            if not truncated:
+                piece = f"\n--- Document {i+1}: {filename} ---\nRelevance: {relevance}\nContent:\n{content}\n"
+                if len(piece) > remaining:
+                    context_buffer.write(piece[:remaining])
+                    context_buffer.write(CONTEXT_TRUNCATED_NOTE)
+                    truncated = True
+                else:
+                    context_buffer.write(piece)
+                    remaining -= len(piece)
+            
+            # Add to sources
+            sources.append({
+                "filename": filename,
+                "relevance": str(relevance)
+            })
+            
+        except Exception as e:
+            logger.error(f"❌ Error processing search result {i}: {str(e)}")
+            continue
+    
+    return context_buffer.getvalue(), sources
+
+class PreparedQuery(NamedTuple):
+    """Everything a query gathers before the answer is generated"""
+    question: str
+    query_embeddings: List[float]
+    context: str
+    sources: List[Dict[str, str]]
+    documents_found: int
+    search_method: str
+    embedding_method: str
+    web_search_results: Optional[str]
+
+async def _prepare_query(
+    request: QueryRequest,
+    db: AsyncSession,
+    ai_service: AIService,
+    vector_service: VectorService,
+    multi_agent_service: MultiAgentService,
+    current_user
+) -> Union[PreparedQuery, Dict[str, Any]]:
+    """Retrieve the context for a question, or return a cached response to a near-identical one"""
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question is required")
+    
+    logger.debug(
+        "🔍 Processing question for user %s (session %s, web search %s): %s",
+        current_user.user_id, request.session_id, request.use_web_search, question
+    )
+    
+    # The session lookup and the question embedding are independent, so run them together
+    (chat_creation_time, user_document_count), query_embeddings = await asyncio.gather(
+        _get_query_scope(db, request.session_id, current_user.user_id),
+        ai_service.create_question_embeddings(question)
+    )
+    if not request.session_id:
+        logger.debug("🔍 No session_id provided, searching all user documents")
+    elif chat_creation_time:
+        logger.debug("🔍 Filtering documents for chat session %s created at %s", request.session_id, chat_creation_time)
+    else:
+        logger.warning("❌ Chat session %s not found or access denied for user %s", request.session_id, current_user.user_id)
+    
+    # Vector search needs only the embedding, so it runs alongside the response-cache
+    # lookup instead of after it; a cache hit just drops its result
+    vector_task = asyncio.create_task(_vector_search(
+        vector_service, query_embeddings, current_user.user_id, request.session_id, chat_creation_time
+    ))
+    
+    # A near-identical question in the same scope skips search and generation
+    cached_response = await run_in_threadpool(
+        vector_service.find_cached_response, query_embeddings, current_user.user_id, request.session_id, request.use_web_search
+    )
+    if cached_response:
+        vector_task.cancel()
+        return cached_response
+    
+    # A user with no documents can't get document context, so their web search starts now
+    # and overlaps the rest of retrieval. Otherwise it only runs once the context turns out
+    # thin, so queries answered from documents never call the external search API
+    web_search_task = None
+    if request.use_web_search and user_document_count == 0:
+        web_search_task = asyncio.create_task(multi_agent_service.search_web(question))
+    
+    # Search for relevant documents
+    embedding_method = "all-minilm-l6-v2"  # Updated to use all-MiniLM-L6-v2
+    
+    # Try vector search first (started above, alongside the response-cache lookup)
+    search_results, search_method = await vector_task
+    
+    # Fallback to full-text search if vector search failed or returned no results
+    if not search_results:
+        try:
+            logger.debug("🔄 Falling back to full-text search")
+            
+            # Postgres ranks documents against the question with its full-text index:
+            # the session's documents first, then all of the user's if none of those match
+            rows = []
+            if request.session_id:
+                rows = await search_documents_fulltext_async(
+                    db, current_user.user_id, question, session_id=request.session_id
+                )
+                logger.debug("🔍 Session full-text search matched %d documents for user %s, session %s", len(rows), current_user.user_id, request.session_id)
+                search_method = "session_full_text_search"
+            if not rows:
+                if request.session_id:
+                    logger.debug("🔄 No session-specific documents matched, falling back to all user documents")
+                rows = await search_documents_fulltext_async(db, current_user.user_id, question)
+                search_method = "full_text_search_fallback" if request.session_id else "full_text_search"
+            
+            if rows:
+                search_results = [_fulltext_result(row) for row in rows]
+                logger.debug("✅ Full-text search successful: %d results", len(search_results))
+            else:
+                logger.warning("❌ No documents matched the question")
+        except Exception as e:
+            logger.error(f"❌ Full-text search failed: {str(e)}")
+    
+    # Prepare context and sources from search results
+    documents_found = len(search_results)
+    if search_results:
+        logger.debug("📄 Processing %d search results", len(search_results))
+    context, sources = _build_context(search_results)
+    
+    # Generate AI response
+    logger.debug("🤖 Generating AI response")
+    web_search_results = None
+    
+    # Check if we need web search
+    if request.use_web_search and (not context or len(context.strip()) < 100):
+        logger.debug("🌐 Context insufficient, using web search")
+        try:
+            web_search_results = await (web_search_task or multi_agent_service.search_web(question))
+            if web_search_results:
+                logger.debug("✅ Web search successful")
+            else:
+                logger.warning("❌ Web search returned no results")
+        except Exception as e:
+            logger.error(f"❌ Web search failed: {str(e)}")
+    elif web_search_task:
+        web_search_task.cancel()
+    
+    return PreparedQuery(
+        question=question,
+        query_embeddings=query_embeddings,
+        context=context,
+        sources=sources,
+        documents_found=documents_found,
+        search_method=search_method,
+        embedding_method=embedding_method,
+        web_search_results=web_search_results
+    )
+
+async def _finish_query(
+    prepared: PreparedQuery,
+    ai_response: Dict[str, Any],
+    request: QueryRequest,
+    vector_service: VectorService,
+    current_user
+) -> QueryResponse:
+    """Build the QueryResponse for a generated answer and cache it"""
+    documents_found = prepared.documents_found
+    search_method = prepared.search_method
+    
+    # Extract response data
+    answer = ai_response.get("answer", "I'm sorry, I couldn't generate a response.")
+    assistant_name = ai_response.get("assistant_name", "AI Assistant")
+    assistant_description = ai_response.get("assistant_description", "General purpose AI assistant")
+    model_used = ai_response.get("model_used", "Unknown")
+    web_search_used = ai_response.get("web_search_used", False)
+    fallback_used = ai_response.get("fallback_response", False)
+    
+    # One summary line per answered query; the step-by-step detail above is debug-only
+    logger.info(
+        "✅ Response generated: documents=%d search=%s ai=%s web_search=%s fallback=%s",
+        documents_found, search_method, assistant_name, web_search_used, fallback_used
+    )
+    
+    # Every field comes from our own pipeline, so skip construction-time validation;
+    # response_model still validates the response once on the way out
+    response = QueryResponse.construct(
+        answer=answer,
+        sources=prepared.sources,
+        documents_found=documents_found,
+        search_method=search_method,
+        ai_method=assistant_name,
+        embedding_method=prepared.embedding_method,
+        fallback_used=fallback_used,
+        assistant_name=assistant_name,
+        assistant_description=assistant_description,
+        web_search_used=web_search_used,
+        model_used=model_used
+    )
+    
+    # Fallback answers mean generation failed; let the next ask retry
+    if not fallback_used:
+        await run_in_threadpool(
+            vector_service.cache_response, prepared.query_embeddings, current_user.user_id, request.session_id,
+            request.use_web_search, response.dict()
+        )
+    
+    return response
+
+# Queries being answered right now, keyed by _inflight_key; duplicates await the same future
+_inflight_queries: Dict[str, asyncio.Future] = {}
+
+def _inflight_key(request: QueryRequest, user_id: str) -> str:
+    """Identify a query by user, scope, web search flag and whitespace/case-normalized question"""
+    question = " ".join(request.question.lower().split())
+    raw = f"{user_id}\0{request.session_id}\0{request.use_web_search}\0{question}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+async def run_rag(
+    request: QueryRequest,
+    db: AsyncSession,
+    ai_service: AIService,
+    vector_service: VectorService,
+    multi_agent_service: MultiAgentService,
+    current_user
+) -> Union[QueryResponse, Dict[str, Any]]:
+    """Answer a question end to end: retrieval, generation, and the response cache"""
+    prepared = await _prepare_query(request, db, ai_service, vector_service, multi_agent_service, current_user)
+    if not isinstance(prepared, PreparedQuery):
+        return prepared
+    
+    # Generate response using the simplified AI service
+    ai_response = await multi_agent_service.generate_response(
+        question=prepared.question,
+        context=prepared.context,
+        web_search_results=prepared.web_search_results
+    )
+    return await _finish_query(prepared, ai_response, request, vector_service, current_user)
+
+async def _coalesced(key: str, run: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run the query behind key, unless an identical one is already in flight, in which
+    case await that one instead; its result (or error) is shared
+    """
+    while True:
+        inflight = _inflight_queries.get(key)
+        if inflight is None:
+            break
+        logger.info("🔁 Identical query already in flight, sharing its result")
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # The leading request was cancelled (its client went away), not this one:
+            # run the query here instead, unless another follower already took over
+            logger.info("🔁 Shared query was cancelled, retrying it")
+    
+    future = asyncio.get_running_loop().create_future()
+    # Nobody may be waiting on it, so mark a stored exception as retrieved
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight_queries[key] = future
+    try:
+        result = await run()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        del _inflight_queries[key]
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
 @router.post("/", response_model=QueryResponse)
 async def query_documents(
     request: QueryRequest,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)  # Require authentication
+    db: AsyncSession = Depends(get_async_db),
+    ai_service: AIService = Depends(get_ai_service),
+    vector_service: VectorService = Depends(get_vector_service),
+    multi_agent_service: MultiAgentService = Depends(get_multi_agent_service),
+    current_user = Depends(get_current_principal)  # Require authentication
 ):
     """Query documents using RAG with AI assistant and web search for the authenticated user"""
     try:
-        question = request.question.strip()
-        if not question:
-            raise HTTPException(status_code=400, detail="Question is required")
-        
-        logger.info(f"🔍 Processing question for user {current_user.user_id}: {question}")
-        logger.info(f"🔍 Session ID received: {request.session_id}")
-        logger.info(f"🔍 Web search enabled: {request.use_web_search}")
-        
-        # Get chat session creation time if session_id is provided
-        chat_creation_time = None
-        logger.info(f"🔍 Request session_id: {request.session_id}")
-        if request.session_id:
-            from app.core.database import ChatSession
-            # Ensure the chat session belongs to the current user
-            chat_session = db.query(ChatSession).filter(
-                ChatSession.session_id == request.session_id,
-                ChatSession.user_id == current_user.user_id
-            ).first()
-            if chat_session:
-                chat_creation_time = chat_session.created_at
-                logger.info(f"🔍 Filtering documents for chat session {request.session_id} created at {chat_creation_time}")
-                logger.info(f"🔍 Chat session found: {chat_session.session_id}")
-            else:
-                logger.warning(f"❌ Chat session {request.session_id} not found or access denied for user {current_user.user_id}")
-                logger.warning(f"❌ Available chat sessions for user: {[cs.session_id for cs in db.query(ChatSession).filter(ChatSession.user_id == current_user.user_id).all()]}")
-        else:
-            logger.info("🔍 No session_id provided, searching all user documents")
-        
-        logger.info(f"🔍 Final chat_creation_time: {chat_creation_time}")
-        
-        # Create question embeddings
-        query_embeddings = await ai_service.create_question_embeddings(question)
-        
-        # Search for relevant documents
-        search_results = []
-        search_method = "fallback"
-        embedding_method = "all-minilm-l6-v2"  # Updated to use all-MiniLM-L6-v2
-        
-        # Try vector search first
-        if vector_service.is_available():
-            try:
-                # Use session-based search if session_id is provided
-                if request.session_id:
-                    vector_results = vector_service.search_documents_with_session_filter(
-                        query_embeddings, 
-                        current_user.user_id,
-                        request.session_id,
-                        limit=10
-                    )
-                    logger.info(f"🔍 Session-based vector search returned {len(vector_results)} results for user {current_user.user_id}, session {request.session_id}")
-                    
-                    # If no session-specific results, fall back to user-based search
-                    if not vector_results:
-                        logger.info("🔄 No session-specific documents found, falling back to user-based search")
-                        vector_results = vector_service.search_documents_with_user_filter(
-                            query_embeddings, 
-                            current_user.user_id,
-                            limit=10
-                        )
-                        logger.info(f"🔍 User-based vector search returned {len(vector_results)} results for user {current_user.user_id}")
-                        search_method = "user_vector_search_fallback"
-                    else:
-                        search_method = "session_vector_search"
-                else:
-                    # Fallback to user-based search if no session_id
-                    vector_results = vector_service.search_documents_with_user_filter(
-                        query_embeddings, 
-                        current_user.user_id,
-                        limit=10
-                    )
-                    logger.info(f"🔍 User-based vector search returned {len(vector_results)} results for user {current_user.user_id}")
-                    search_method = "user_vector_search"
-                
-                if vector_results:
-                    search_results = vector_results
-                    logger.info(f"✅ Vector search successful: {len(search_results)} results")
-                else:
-                    logger.warning("❌ Vector search returned no results")
-            except Exception as e:
-                logger.error(f"❌ Vector search failed: {str(e)}")
-        
-        # Fallback to full-text search if vector search failed or returned no results
-        if not search_results:
-            try:
-                logger.info("🔄 Falling back to full-text search")
-                
-                # Get documents for the user and session
-                if request.session_id:
-                    # Get documents for specific session
-                    all_documents = get_documents_by_session(db, current_user.user_id, request.session_id)
-                    logger.info(f"🔍 Found {len(all_documents)} documents for user {current_user.user_id}, session {request.session_id}")
-                    
-                    # If no session-specific documents, fall back to all user documents
-                    if not all_documents:
-                        logger.info("🔄 No session-specific documents found, falling back to all user documents")
-                        all_documents = get_all_documents(db, current_user.user_id)
-                        logger.info(f"🔍 Found {len(all_documents)} total documents for user {current_user.user_id}")
-                        search_method = "full_text_search_fallback"
-                    else:
-                        search_method = "session_full_text_search"
-                else:
-                    # Get all documents for the user (fallback)
-                    all_documents = get_all_documents(db, current_user.user_id)
-                    logger.info(f"🔍 Found {len(all_documents)} total documents for user {current_user.user_id}")
-                    search_method = "full_text_search"
-                
-                if all_documents:
-                    # Simple keyword matching
-                    question_lower = question.lower()
-                    relevant_docs = []
-                    
-                    for doc in all_documents:
-                        # Check if question keywords appear in document content
-                        doc_content_lower = doc.text_content.lower() if doc.text_content else ""
-                        question_words = question_lower.split()
-                        
-                        # Count matching words
-                        matches = sum(1 for word in question_words if len(word) > 3 and word in doc_content_lower)
-                        
-                        if matches > 0:
-                            relevance_score = matches / len(question_words)
-                            relevant_docs.append({
-                                'id': doc.id,
-                                'filename': doc.filename,
-                                'content': doc.text_content,
-                                'relevance_score': relevance_score,
-                                'metadata': {
-                                    'upload_date': doc.upload_date.isoformat(),
-                                    'user_id': doc.user_id,
-                                    'session_id': doc.session_id
-                                }
-                            })
-                    
-                    # Sort by relevance and take top results
-                    relevant_docs.sort(key=lambda x: x['relevance_score'], reverse=True)
-                    search_results = relevant_docs[:5]
-                    search_method = "session_full_text_search" if request.session_id else "full_text_search"
-                    logger.info(f"✅ Full-text search successful: {len(search_results)} results")
-                else:
-                    logger.warning("❌ No documents found for user")
-            except Exception as e:
-                logger.error(f"❌ Full-text search failed: {str(e)}")
-        
-        # Prepare context from search results
-        context = ""
-        sources = []
-        documents_found = len(search_results)
-        
-        if search_results:
-            logger.info(f"📄 Processing {len(search_results)} search results")
-            
-            for i, result in enumerate(search_results):
-                try:
-                    # Handle different result structures
-                    if 'payload' in result:
-                        # Vector search result structure
-                        payload = result.get('payload', {})
-                        filename = payload.get('filename', f'Document {i+1}')
-                        content = payload.get('text', '')
-                        relevance = result.get('score', 'Unknown')
-                    else:
-                        # Full-text search result structure
-                        filename = result.get('filename', f'Document {i+1}')
-                        content = result.get('content', '')
-                        relevance = result.get('relevance_score', 'Unknown')
-                    
-                    # Add to context
-                    context += f"\n--- Document {i+1}: {filename} ---\n"
-                    context += f"Relevance: {relevance}\n"
-                    context += f"Content:\n{content}\n"
-                    
-                    # Add to sources
-                    sources.append({
-                        "filename": filename,
-                        "relevance": str(relevance)
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error processing search result {i}: {str(e)}")
-                    continue
-        
-        # Generate AI response
-        logger.info("🤖 Generating AI response")
-        web_search_results = None
-        
-        # Check if we need web search
-        if request.use_web_search and (not context or len(context.strip()) < 100):
-            logger.info("🌐 Context insufficient, performing web search")
-            try:
-                web_search_results = await multi_agent_service.search_web(question)
-                if web_search_results:
-                    logger.info("✅ Web search successful")
-                else:
-                    logger.warning("❌ Web search returned no results")
-            except Exception as e:
-                logger.error(f"❌ Web search failed: {str(e)}")
-        
-        # Generate response using the simplified AI service
-        ai_response = await multi_agent_service.generate_response(
-            question=question,
-            context=context,
-            web_search_results=web_search_results
-        )
-        
-        # Extract response data
-        answer = ai_response.get("answer", "I'm sorry, I couldn't generate a response.")
-        assistant_name = ai_response.get("assistant_name", "AI Assistant")
-        assistant_description = ai_response.get("assistant_description", "General purpose AI assistant")
-        model_used = ai_response.get("model_used", "Unknown")
-        web_search_used = ai_response.get("web_search_used", False)
-        fallback_used = ai_response.get("fallback_response", False)
-        
-        logger.info(f"✅ Response generated successfully")
-        logger.info(f"📊 Documents found: {documents_found}")
-        logger.info(f"🔍 Search method: {search_method}")
-        logger.info(f"🤖 AI method: {assistant_name}")
-        logger.info(f"🌐 Web search used: {web_search_used}")
-        logger.info(f"⚠️ Fallback used: {fallback_used}")
-        
-        return QueryResponse(
-            answer=answer,
-            sources=sources,
-            documents_found=documents_found,
-            search_method=search_method,
-            ai_method=assistant_name,
-            embedding_method=embedding_method,
-            fallback_used=fallback_used,
-            assistant_name=assistant_name,
-            assistant_description=assistant_description,
-            web_search_used=web_search_used,
-            model_used=model_used
+        return await _coalesced(
+            _inflight_key(request, current_user.user_id),
+            lambda: run_rag(request, db, ai_service, vector_service, multi_agent_service, current_user)
         )
         
     except HTTPException:
@@ -283,20 +474,56 @@ async def query_documents(
         logger.error(f"❌ Query processing failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/stream")
+async def stream_query(
+    request: QueryRequest,
+    db: AsyncSession = Depends(get_async_db),
+    ai_service: AIService = Depends(get_ai_service),
+    vector_service: VectorService = Depends(get_vector_service),
+    multi_agent_service: MultiAgentService = Depends(get_multi_agent_service),
+    current_user = Depends(get_current_principal)  # Require authentication
+):
+    """
+    Same as POST / but streams the answer as server-sent events: "token" events carry
+    answer text as it is generated, and a final "done" event carries the full QueryResponse
+    """
+    # Retrieval runs before the stream opens, so its errors are still plain HTTP errors
+    try:
+        prepared = await _prepare_query(request, db, ai_service, vector_service, multi_agent_service, current_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Query processing failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def events():
+        if not isinstance(prepared, PreparedQuery):
+            yield _sse("token", {"text": prepared["answer"]})
+            yield _sse("done", prepared)
+            return
+        
+        ai_response = {}
+        async for item in multi_agent_service.generate_response_stream(
+            question=prepared.question,
+            context=prepared.context,
+            web_search_results=prepared.web_search_results
+        ):
+            if isinstance(item, str):
+                yield _sse("token", {"text": item})
+            else:
+                ai_response = item
+        
+        response = await _finish_query(prepared, ai_response, request, vector_service, current_user)
+        yield _sse("done", response.dict())
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/domains")
 async def get_available_domains():
     """Get available AI assistant information"""
-    try:
-        # Return simplified assistant information
-        return {
-            "assistants": [
-                {
-                    "id": "general",
-                    "name": "AI Assistant",
-                    "description": "General purpose AI assistant for document analysis and web search"
-                }
-            ]
-        }
-    except Exception as e:
-        logger.error(f"Failed to get assistant information: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to get assistant information") 
\ No newline at end of file
+    return AVAILABLE_ASSISTANTS
@@ -1,24 +1,82 @@
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
-from app.core.database import get_db, User
+import jwt
+from app.core.database import get_db, User, ChatSession
 from app.core.config import settings
-from typing import Optional
+from typing import NamedTuple, Optional
+from cachetools import TTLCache
+import hashlib
+import threading
+import time
 
-def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db)
-) -> User:
+# Recently verified JWT payloads keyed by SHA-256 of the raw token, so repeated
+# requests from the same client skip signature verification for a few seconds
+_jwt_cache = TTLCache(maxsize=10_000, ttl=5)
+_jwt_cache_lock = threading.Lock()
+
+# Resolved users keyed by email, so an authenticated request doesn't re-query
+# Postgres for the same user; cached instances are detached from any session
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+# Chat session owners keyed by session_id. Session ids are unique and never change
+# owner, so an entry only goes stale when the session is deleted
+_session_owner_cache = TTLCache(maxsize=10_000, ttl=300)
+_session_owner_cache_lock = threading.Lock()
+
+def owns_session(db: Session, session_id: str, user_id: str) -> bool:
+    """Check that session_id belongs to user_id, hitting Postgres only on a cache miss"""
+    with _session_owner_cache_lock:
+        owner = _session_owner_cache.get(session_id)
+    if owner is None:
+        owner = db.query(ChatSession.user_id).filter(
+            ChatSession.session_id == session_id
+        ).scalar()
+        if owner is None:
+            return False
+        with _session_owner_cache_lock:
+            _session_owner_cache[session_id] = owner
+    return owner == user_id
+
+def invalidate_session_owner(session_id: str):
+    """Drop a cached session owner, e.g. when the session is deleted"""
+    with _session_owner_cache_lock:
+        _session_owner_cache.pop(session_id, None)
+
+def invalidate_user_cache(email: str):
+    """Drop a cached user, e.g. after login updates the profile or on logout"""
+    with _user_cache_lock:
+        _user_cache.pop(email, None)
+
+def decode_token(token: str) -> dict:
     """
-    Get the current authenticated user from JWT token.
-    This dependency can be used in any endpoint that requires authentication.
+    Decode and verify a JWT, reusing a recently verified payload when possible.
     
-    Returns:
-        User: The authenticated user object
-        
     Raises:
-        HTTPException: If user is not authenticated or token is invalid
+        jwt.PyJWTError: If the token is invalid or expired
     """
+    key = hashlib.sha256(token.encode()).digest()
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(key)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    
+    payload = jwt.decode(
+        token, 
+        settings.JWT_SECRET, 
+        algorithms=[settings.JWT_ALGORITHM]
+    )
+    with _jwt_cache_lock:
+        _jwt_cache[key] = payload
+    return payload
+
+class Principal(NamedTuple):
+    """The authenticated identity, taken from verified JWT claims"""
+    user_id: str
+    email: str
+
+def _request_token(request: Request) -> Optional[str]:
+    """The JWT from the auth cookie (web requests) or a Bearer header (API requests)"""
     # Try to get token from cookies first (for web requests)
     token = request.cookies.get("auth_token")
     
@@ -27,7 +85,18 @@ def get_current_user(
         auth_header = request.headers.get("authorization") or request.headers.get("Authorization")
         if auth_header and auth_header.lower().startswith("bearer "):
             token = auth_header.split(" ", 1)[1]
+    return token
+
+def get_current_principal(request: Request) -> Principal:
+    """
+    Get the authenticated identity from the JWT alone, with no database access.
+    Tokens are only issued for existing users and carry their user_id, so this is
+    enough for endpoints that just scope data by user.
     
+    Raises:
+        HTTPException: If user is not authenticated or token is invalid
+    """
+    token = _request_token(request)
     if not token:
         raise HTTPException(
             status_code=401, 
@@ -36,40 +105,62 @@ def get_current_user(
     
     try:
         # Decode and verify the JWT token
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET, 
-            algorithms=[settings.JWT_ALGORITHM]
+        payload = decode_token(token)
+    except jwt.PyJWTError:
+        raise HTTPException(
+            status_code=401, 
+            detail="Invalid or expired token"
         )
+    
+    # Extract user information from token
+    user_id = payload.get("sub")
+    email = payload.get("email")
+    if not user_id or not email:
+        raise HTTPException(
+            status_code=401, 
+            detail="Invalid token payload"
+        )
+    return Principal(user_id=user_id, email=email)
+
+def get_current_user(
+    request: Request,
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Get the current authenticated user's row, for endpoints that need more than
+    the identity in the token (see get_current_principal).
+    
+    Returns:
+        User: The authenticated user object
         
-        # Extract user information from token
-        user_id = payload.get("sub")
-        email = payload.get("email")
-        
-        if not user_id or not email:
-            raise HTTPException(
-                status_code=401, 
-                detail="Invalid token payload"
-            )
+    Raises:
+        HTTPException: If user is not authenticated or token is invalid
+    """
+    principal = get_current_principal(request)
+    
+    try:
+        with _user_cache_lock:
+            user = _user_cache.get(principal.email)
+        if user is not None:
+            return user
         
         # Find user in database
-        user = db.query(User).filter(User.user_id == user_id).first()
+        user = db.query(User).filter(User.user_id == principal.user_id).first()
         if not user:
             # Fallback: try to find by email
-            user = db.query(User).filter(User.email == email).first()
+            user = db.query(User).filter(User.email == principal.email).first()
             if not user:
                 raise HTTPException(
                     status_code=404, 
                     detail="User not found"
                 )
         
+        # Detach so the cached instance isn't tied to this request's session
+        db.expunge(user)
+        with _user_cache_lock:
+            _user_cache[principal.email] = user
         return user
         
-    except JWTError:
-        raise HTTPException(
-            status_code=401, 
-            detail="Invalid or expired token"
-        )
     except Exception as e:
         raise HTTPException(
             status_code=401, 
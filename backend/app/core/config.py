@@ -1,57 +1,83 @@
-import os
+from functools import lru_cache
+from pathlib import Path
 from pydantic import BaseSettings
-from dotenv import load_dotenv
 
-load_dotenv()
+# backend/.env, found regardless of the directory the server is started from
+ENV_FILE = Path(__file__).resolve().parents[2] / ".env"
 
 class Settings(BaseSettings):
+    # Values come from the environment, then ENV_FILE, then these defaults; the .env file
+    # is read once, when get_settings() first builds the settings
+    
+    # Server: "dev" turns on auto-reload and info-level server logs when started via run.py
+    ENV: str = "production"
+    # Server worker processes when started via run.py (0 = one per CPU); dev runs one, reloading
+    WEB_CONCURRENCY: int = 0
+    
     # Database
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
-    POSTGRES_USER: str = os.getenv("POSTGRES_USER", "payalpatel")
-    POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", "localhost")
-    POSTGRES_DB: str = os.getenv("POSTGRES_DB", "rag_database")
-    POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "")
-    POSTGRES_PORT: int = int(os.getenv("POSTGRES_PORT", "5432"))
+    DATABASE_URL: str = ""
+    POSTGRES_USER: str = "payalpatel"
+    POSTGRES_HOST: str = "localhost"
+    POSTGRES_DB: str = "rag_database"
+    POSTGRES_PASSWORD: str = ""
+    POSTGRES_PORT: int = 5432
+    # Server-side cap on any one statement (ms), so a runaway query can't hold a pooled
+    # connection; 0 leaves it unset (e.g. behind a pooler that rejects startup options)
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
     
     # Google AI
-    GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    GOOGLE_API_KEY: str = ""
     
     # Qdrant
-    QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
-    QDRANT_API_KEY: str = os.getenv("QDRANT_API_KEY", "")
+    QDRANT_URL: str = "http://localhost:6333"
+    QDRANT_API_KEY: str = ""
+    # Talk to Qdrant over gRPC (falls back to HTTP if the gRPC port is unreachable)
+    QDRANT_PREFER_GRPC: bool = True
+    QDRANT_GRPC_PORT: int = 6334
+    # Seconds before a Qdrant request is abandoned
+    QDRANT_TIMEOUT: int = 10
     
     # File upload
     UPLOAD_DIR: str = "uploads"
-    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB per uploaded file
+    # Worker processes for text extraction, per server worker. Every server worker gets its own
+    # pool, so keep this small; 0 = one per CPU, which multiplies with WEB_CONCURRENCY
+    EXTRACTION_WORKERS: int = 2
     
     # AI Models - Single model for all functionality
     EMBEDDING_MODEL: str = "embedding-001"
+    # "api" embeds through the Hugging Face Inference API; "local" runs all-MiniLM-L6-v2
+    # in-process (needs the optional sentence-transformers package)
+    EMBEDDING_BACKEND: str = "api"
     GENERATION_MODEL: str = "gemini-1.5-flash"
     
     # MCP Server Configuration
-    MCP_SERVER_ENABLED: bool = os.getenv("MCP_SERVER_ENABLED", "true").lower() == "true"
-    MCP_SERVER_URL: str = os.getenv("MCP_SERVER_URL", "http://localhost:3001")
-    MCP_SERVER_API_KEY: str = os.getenv("MCP_SERVER_API_KEY", "")
+    MCP_SERVER_ENABLED: bool = True
+    MCP_SERVER_URL: str = "http://localhost:3001"
+    MCP_SERVER_API_KEY: str = ""
     
     # Web Search Configuration
-    WEB_SEARCH_ENABLED: bool = os.getenv("WEB_SEARCH_ENABLED", "true").lower() == "true"
-    WEB_SEARCH_API_KEY: str = os.getenv("WEB_SEARCH_API_KEY", "")
+    WEB_SEARCH_ENABLED: bool = True
+    WEB_SEARCH_API_KEY: str = ""
     
     # CORS / Frontend origins (comma-separated). Example: "http://localhost:3000,https://your-app.vercel.app"
-    ALLOWED_ORIGINS: str = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000")
+    ALLOWED_ORIGINS: str = "http://localhost:3000"
     
     # Auth / OAuth
-    GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
-    GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
-    OAUTH_REDIRECT_URI: str = os.getenv(
-        "OAUTH_REDIRECT_URI", "http://localhost:8000/api/auth/google/callback"
-    )
-    FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
-    JWT_SECRET: str = os.getenv("JWT_SECRET", "dev-secret-change-me")
-    JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
+    GOOGLE_CLIENT_ID: str = ""
+    GOOGLE_CLIENT_SECRET: str = ""
+    OAUTH_REDIRECT_URI: str = "http://localhost:8000/api/auth/google/callback"
+    FRONTEND_URL: str = "http://localhost:3000"
+    JWT_SECRET: str = "dev-secret-change-me"
+    JWT_ALGORITHM: str = "HS256"
     
     class Config:
-        env_file = ".env"
+        env_file = ENV_FILE
         case_sensitive = False
 
-settings = Settings() 
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The process-wide settings, parsed from the environment once"""
+    return Settings()
+
+settings = get_settings() 
\ No newline at end of file
@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, JSON, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, JSON, ForeignKey, Boolean, Index, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 from sqlalchemy.sql import func
 from app.core.config import settings
 import uuid
@@ -24,8 +27,57 @@ if (
 
 DATABASE_URL = raw_database_url
 
-engine = create_engine(DATABASE_URL)
+# Tags our connections in pg_stat_activity
+APPLICATION_NAME = "rag-backend"
+# Managed Postgres (Neon/Render) drops idle connections, so pooled ones are recycled
+# before that and pinged on checkout
+POOL_RECYCLE_SECONDS = 300
+
+_sync_connect_args = {"application_name": APPLICATION_NAME}
+if settings.DB_STATEMENT_TIMEOUT_MS:
+    _sync_connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+# Sync sessions are used from FastAPI's threadpool (40 threads), so the pool can serve
+# every thread at once instead of queueing them behind the default 5 + 10 connections
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=20,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=POOL_RECYCLE_SECONDS,
+    connect_args=_sync_connect_args
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_database_url(url: str):
+    """
+    Build the asyncpg URL and connect args from DATABASE_URL. asyncpg rejects
+    libpq-only query params, so sslmode becomes its ssl argument and
+    channel_binding is dropped.
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    server_settings = {"application_name": APPLICATION_NAME}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    connect_args = {"server_settings": server_settings}
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+# Async engine for handlers on the request hot path, so DB waits don't block the event loop
+_async_url, _async_connect_args = _async_database_url(DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    pool_size=20,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=POOL_RECYCLE_SECONDS,
+    connect_args=_async_connect_args
+)
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 class User(Base):
@@ -58,9 +110,22 @@ class Document(Base):
     metadata_json = Column(JSON)
     user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
     session_id = Column(String, ForeignKey("chat_sessions.session_id"), nullable=True)  # NEW: Associate with chat session
+    status = Column(String, nullable=False, default="completed", server_default="completed")  # processing, completed, failed
+    # Full-text search vector, kept in sync with text_content by Postgres; deferred so
+    # ordinary document loads don't fetch it
+    tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', coalesce(text_content, ''))", persisted=True)))
     
     # Relationships
     user = relationship("User", back_populates="documents")
+    
+    __table_args__ = (
+        # Serves the per-user document list, paginated in id order
+        Index("ix_documents_user_id", "user_id", "id"),
+        # Serves session-scoped document lookups, newest first
+        Index("ix_documents_user_session", "user_id", "session_id", upload_date.desc()),
+        # Serves the keyword fallback search
+        Index("ix_documents_tsv", "tsv", postgresql_using="gin"),
+    )
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
@@ -75,6 +140,13 @@ class ChatSession(Base):
     # Relationships
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Serves the per-user session list ordered by most recently updated
+        Index("ix_chat_sessions_user_updated", "user_id", "updated_at", "created_at"),
+        # Ownership lookups filter by (session_id, user_id); also the conflict target for upserts
+        UniqueConstraint("session_id", "user_id", name="uq_session_user"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -91,10 +163,19 @@ class Message(Base):
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+    
+    __table_args__ = (
+        # Serves message history for a user (optionally one session) ordered by timestamp
+        Index("ix_messages_user_session_ts", "user_id", "session_id", "timestamp"),
+    )
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,18 +1,67 @@
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
+import httpx
+import os
 from app.api.routes import documents, chat, query, messages, auth
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, async_engine, Base
+from app.services.ai_service import AIService
+from app.services.document_processor import shutdown_extraction_pool
+from app.services.multi_agent_service import AIService as MultiAgentService
+from app.services.vector_service import VectorService
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Serializes table creation across server workers; arbitrary, app-wide
+SCHEMA_LOCK_ID = 7305
+
+def create_tables():
+    """
+    Create missing database tables. Every server worker runs this at startup, so it
+    holds a Postgres advisory lock; otherwise concurrent CREATE TABLEs race on first boot
+    """
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SCHEMA_LOCK_ID})
+        Base.metadata.create_all(bind=connection)
 
 app = FastAPI(
     title="RAG API",
     description="Retrieval-Augmented Generation API with advanced PDF processing",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes large model lists (documents, sessions) much faster than json.dumps
+    default_response_class=ORJSONResponse
 )
 
+# Single-file upload endpoints; the multipart envelope adds a little on top of the file itself
+SINGLE_UPLOAD_PATHS = {"/api/documents/upload", "/api/documents/upload-async"}
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadSizeLimitMiddleware:
+    """
+    Fail fast on a declared oversized upload, before its body is read and spooled to disk;
+    bodies without Content-Length are bounded while streaming to the temp file.
+    Plain ASGI rather than @app.middleware("http"), which would run every request (and
+    stream every response) through an extra task
+    """
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in SINGLE_UPLOAD_PATHS:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+                response = ORJSONResponse(
+                    status_code=413,
+                    content={"detail": f"File is larger than the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB upload limit"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+# Added before CORS so CORS wraps it, and browsers can read the 413
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # CORS middleware
 origins = [origin.strip() for origin in settings.ALLOWED_ORIGINS.split(',') if origin.strip()]
 
@@ -24,6 +73,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # At startup rather than import, so importing app.main (e.g. the reloader) touches no database
+    await run_in_threadpool(create_tables)
+    # Shared outbound HTTP client so connections (e.g. to Google OAuth, Hugging Face) are
+    # reused; the transport retries failed connects, and owns the pool limits
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(15, connect=3),
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+    )
+    # Build the shared services once, up front, so the first request doesn't pay for
+    # client setup (VectorService connects to Qdrant and checks its collections)
+    app.state.ai_service = AIService(http_client=app.state.http_client)
+    app.state.multi_agent_service = MultiAgentService(http_client=app.state.http_client)
+    app.state.vector_service = await run_in_threadpool(VectorService)
+    # Coalesce per-upload Qdrant upserts, and concurrent question embeddings, into batched requests
+    app.state.vector_service.start_batcher()
+    app.state.ai_service.start_batcher()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.vector_service.stop_batcher()
+    await app.state.ai_service.stop_batcher()
+    shutdown_extraction_pool()
+    await async_engine.dispose()
+    await app.state.http_client.aclose()
+
 # Include routers
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
@@ -42,12 +121,19 @@ async def health_check():
 def main():
     """Main function to run the FastAPI application with uvicorn"""
     import uvicorn
+    dev = settings.ENV == "dev"
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        # uvloop and httptools come with uvicorn[standard]; named here so a missing
+        # install fails loudly instead of falling back to asyncio and h11
+        loop="uvloop",
+        http="httptools",
+        reload=dev,
+        # Several processes, so CPU-bound request work doesn't serialize on one GIL
+        workers=None if dev else (settings.WEB_CONCURRENCY or os.cpu_count()),
+        log_level="info" if dev else "warning"
     )
 
 if __name__ == "__main__":
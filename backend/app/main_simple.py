@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 import logging
+import os
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -10,7 +12,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="RAG API",
     description="Retrieval-Augmented Generation API with advanced PDF processing",
-    version="1.0.0"
+    version="1.0.0",
+    # Same orjson encoding as app.main
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware - allow both localhost and Vercel frontend
@@ -52,12 +56,19 @@ def main():
     """Main function to run the simple FastAPI application with uvicorn"""
     import uvicorn
     logger.info("Starting RAG API server...")
+    dev = settings.ENV == "dev"
     uvicorn.run(
         "app.main_simple:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        # uvloop and httptools come with uvicorn[standard]; named here so a missing
+        # install fails loudly instead of falling back to asyncio and h11
+        loop="uvloop",
+        http="httptools",
+        reload=dev,
+        # Several processes, so CPU-bound request work doesn't serialize on one GIL
+        workers=None if dev else (settings.WEB_CONCURRENCY or os.cpu_count()),
+        log_level="info" if dev else "warning"
     )
 
 if __name__ == "__main__":
@@ -1 +1 @@
-from .document import DocumentCreate, DocumentResponse 
\ No newline at end of file
+from .document import DocumentCreate, DocumentResponse, DocumentStatusResponse 
\ No newline at end of file
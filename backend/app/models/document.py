@@ -1,6 +1,9 @@
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, Dict, Any, List
+from sqlalchemy import Text, cast, func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.database import Document as DocumentDB
 
@@ -15,16 +18,24 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     document_id: str
 
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    status: str
+    text_length: Optional[int] = None
+    error: Optional[str] = None
+
 class DocumentResponse(DocumentBase):
     id: int
     document_id: str
     upload_date: datetime
     extraction_method: Optional[str] = None
     vector_storage_method: Optional[str] = None
+    status: Optional[str] = None
     success: bool = True
 
     class Config:
-        from_attributes = True
+        orm_mode = True  # Pydantic v1 spelling
+        from_attributes = True  # Pydantic v2 spelling
 
 # Database operations
 def create_document(db: Session, document: DocumentCreate) -> DocumentDB:
@@ -55,13 +66,40 @@ def get_documents_by_session(db: Session, user_id: str, session_id: str) -> List
         DocumentDB.session_id == session_id
     ).all()
 
+def _any_term_tsquery(question: str):
+    """
+    tsquery matching documents that contain any of the question's terms.
+    plainto_tsquery parses, stems and drops stop words but ANDs the terms together;
+    swapping its & for | turns that into an OR, re-read with the 'simple' config so
+    the already-stemmed lexemes are kept as they are
+    """
+    return func.to_tsquery(
+        "simple",
+        func.replace(cast(func.plainto_tsquery("english", question), Text), "&", "|")
+    )
+
+async def search_documents_fulltext_async(
+    db: AsyncSession, user_id: str, question: str, session_id: Optional[str] = None, limit: int = 5
+) -> List[Row]:
+    """Rank a user's documents (optionally one session's) against the question with Postgres full-text search"""
+    tsquery = _any_term_tsquery(question)
+    rank = func.ts_rank(DocumentDB.tsv, tsquery).label("rank")
+    stmt = select(
+        DocumentDB.id, DocumentDB.filename, DocumentDB.text_content, DocumentDB.upload_date,
+        DocumentDB.user_id, DocumentDB.session_id, rank
+    ).where(
+        DocumentDB.user_id == user_id,
+        DocumentDB.tsv.op("@@")(tsquery)
+    )
+    if session_id:
+        stmt = stmt.where(DocumentDB.session_id == session_id)
+    return (await db.execute(stmt.order_by(rank.desc()).limit(limit))).all()
+
 def get_document_by_id(db: Session, document_id: str) -> Optional[DocumentDB]:
     return db.query(DocumentDB).filter(DocumentDB.document_id == document_id).first()
 
 def delete_document_by_id(db: Session, document_id: str) -> bool:
-    document = db.query(DocumentDB).filter(DocumentDB.document_id == document_id).first()
-    if document:
-        db.delete(document)
-        db.commit()
-        return True
-    return False 
\ No newline at end of file
+    # One DELETE; its row count says whether the document existed
+    deleted = db.query(DocumentDB).filter(DocumentDB.document_id == document_id).delete(synchronize_session=False)
+    db.commit()
+    return deleted > 0 
\ No newline at end of file
@@ -1,15 +1,45 @@
 import google.generativeai as genai
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
 import logging
-from typing import List, Dict, Any
+from typing import List, Optional, Set
+from cachetools import TTLCache
+import asyncio
 import random
+import re
 import hashlib
-import requests
+import httpx
 
 logger = logging.getLogger(__name__)
 
+# Question embeddings that miss the cache within this window (seconds), up to this
+# many, share one Hugging Face request
+QUESTION_BATCH_SIZE = 16
+QUESTION_BATCH_WINDOW = 0.01
+# Batches embedded at once; a slow request doesn't hold up the batches collected after it
+QUESTION_BATCH_CONCURRENCY = 8
+
+# all-MiniLM-L6-v2's output size, and the size of every vector stored in Qdrant
+EMBEDDING_DIMENSION = 384
+
+# Most texts sent to the Hugging Face Inference API in one request; larger batches are
+# split into requests of this size
+EMBEDDING_BATCH_SIZE = 32
+
+# Stripped from both ends of a question before it is used as an embedding cache key
+QUESTION_EDGE_PUNCTUATION = " ?!.,;:'\"`"
+
+def _feature_digest(data: bytes) -> bytes:
+    """
+    16-byte digest feeding the hash-fallback embeddings. Not security-sensitive, so it
+    uses BLAKE2b (stdlib, faster than MD5 on short inputs) at MD5's digest size
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
+
 class AIService:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        # Hugging Face calls go through a pooled client so connections are kept alive across requests
+        self.http_client = http_client or httpx.AsyncClient(timeout=30)
         # Initialize Google Gemini only if API key is available
         self.google_api_available = bool(settings.GOOGLE_API_KEY)
         if self.google_api_available:
@@ -25,37 +55,140 @@ class AIService:
         
         # Initialize all-MiniLM-L6-v2 for embeddings
         self.embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+        self._local_embedding_model = self._load_local_embedding_model() if settings.EMBEDDING_BACKEND == "local" else None
+        # Question embeddings keyed by SHA-256 of the model name and normalized question;
+        # only touched from the event loop, so no lock is needed
+        self._question_embedding_cache = TTLCache(maxsize=2048, ttl=3600)
+        self._question_embedding_hits = 0
+        self._question_embedding_misses = 0
+        # Document embeddings keyed by SHA-256 of the model name and exact text, so
+        # re-uploaded files and repeated chunks skip the Hugging Face round trip
+        self._document_embedding_cache = TTLCache(maxsize=1024, ttl=86400)
+        # Cache misses from concurrent queries are embedded together; see start_batcher
+        self._question_queue: Optional[asyncio.Queue] = None
+        self._question_batcher_task: Optional[asyncio.Task] = None
+        self._question_flush_slots: Optional[asyncio.Semaphore] = None
+        self._question_flushes: Set[asyncio.Task] = set()
         logger.info("Using all-MiniLM-L6-v2 for embeddings and Google Gemini for generation")
     
     async def create_embeddings(self, text: str) -> List[float]:
         """Create embeddings using all-MiniLM-L6-v2 via Hugging Face API"""
+        return (await self.create_embeddings_batch([text]))[0]
+    
+    async def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for several texts, sending only the uncached ones to all-MiniLM-L6-v2 in batched requests"""
+        if not texts:
+            return []
+        keys = [self._document_cache_key(text) for text in texts]
+        results = [self._document_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embeddings in enumerate(results) if embeddings is None]
+        if not missing:
+            return results
+        
+        embeddings = await self._create_all_minilm_embeddings_batch([texts[i] for i in missing])
+        if embeddings is None:
+            # Fallback embeddings aren't cached, so the next upload retries the model
+            logger.info("Falling back to enhanced hash embeddings for batch")
+            embeddings = [self._create_enhanced_embeddings(texts[i]) for i in missing]
+        else:
+            for i, vector in zip(missing, embeddings):
+                self._document_embedding_cache[keys[i]] = vector
+        for i, vector in zip(missing, embeddings):
+            results[i] = vector
+        return results
+    
+    def _document_cache_key(self, text: str) -> bytes:
+        """Cache key for a document's embedding: the model name and the exact text"""
+        return hashlib.sha256(f"{self.embedding_model_name}\0{text}".encode()).digest()
+    
+    def _load_local_embedding_model(self):
+        """Load all-MiniLM-L6-v2 in-process (EMBEDDING_BACKEND=local); None, so the Hugging Face API is used, if it can't be loaded"""
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            logger.warning("EMBEDDING_BACKEND=local but sentence-transformers is not installed; using the Hugging Face API")
+            return None
         try:
-            # Use Hugging Face Inference API for all-MiniLM-L6-v2
-            return await self._create_all_minilm_embeddings(text)
+            model = SentenceTransformer(self.embedding_model_name, device="cpu")
+            logger.info("Loaded all-MiniLM-L6-v2 locally for embeddings")
+            return model
         except Exception as e:
-            logger.error(f"all-MiniLM-L6-v2 embedding failed: {str(e)}")
-            return self._create_enhanced_embeddings(text)
+            logger.error(f"Failed to load local all-MiniLM-L6-v2: {str(e)}; using the Hugging Face API")
+            return None
+    
+    async def _create_all_minilm_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embed texts with all-MiniLM-L6-v2: in-process if loaded, else EMBEDDING_BATCH_SIZE per API request (sent concurrently); None on failure"""
+        if self._local_embedding_model is not None:
+            return await self._encode_all_minilm_locally(texts)
+        if len(texts) <= EMBEDDING_BATCH_SIZE:
+            return await self._request_all_minilm_embeddings(texts)
+        groups = await asyncio.gather(*(
+            self._request_all_minilm_embeddings(texts[start:start + EMBEDDING_BATCH_SIZE])
+            for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+        ))
+        if any(group is None for group in groups):
+            return None
+        return [embeddings for group in groups for embeddings in group]
+    
+    async def _encode_all_minilm_locally(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embed texts with the in-process model, off the event loop; None on failure"""
+        try:
+            # Encoding is CPU-bound; torch releases the GIL while it runs
+            vectors = await run_in_threadpool(self._local_embedding_model.encode, texts, batch_size=64)
+            return [self._pad_embedding(vector.tolist()) for vector in vectors]
+        except Exception as e:
+            logger.error(f"Local all-MiniLM-L6-v2 embedding failed: {str(e)}")
+            return None
+    
+    async def _request_all_minilm_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embed several texts with one all-MiniLM-L6-v2 request; None on failure"""
+        try:
+            api_url = "https://api-inference.huggingface.co/models/sentence-transformers/all-MiniLM-L6-v2"
+            payload = {
+                "inputs": texts,
+                "options": {
+                    "wait_for_model": True
+                }
+            }
+            
+            response = await self.http_client.post(api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=60)
+            
+            if response.status_code == 200:
+                embeddings = response.json()
+                if len(embeddings) == len(texts):
+                    logger.info(f"Created {len(embeddings)} embeddings using all-MiniLM-L6-v2 in one batch")
+                    return [self._pad_embedding(embedding) for embedding in embeddings]
+                logger.warning(f"Hugging Face API returned {len(embeddings)} embeddings for {len(texts)} inputs")
+            else:
+                logger.warning(f"Hugging Face API batch failed: {response.status_code}")
+        except Exception as e:
+            logger.error(f"all-MiniLM-L6-v2 batch embedding failed: {str(e)}")
+        return None
+    
+    def _pad_embedding(self, embedding: List[float]) -> List[float]:
+        """Pad or truncate an embedding to EMBEDDING_DIMENSION"""
+        if len(embedding) < EMBEDDING_DIMENSION:
+            return embedding + [0.0] * (EMBEDDING_DIMENSION - len(embedding))
+        return embedding[:EMBEDDING_DIMENSION]
     
     def _create_enhanced_embeddings(self, text: str) -> List[float]:
         """Create enhanced semantic embeddings"""
         try:
             # Create multiple hashes for better semantic representation
-            import re
             
             # Clean and normalize text
             text_clean = re.sub(r'[^\w\s]', ' ', text.lower())
             words = text_clean.split()
             
-            # Create embeddings from different text representations
+            # Create embeddings from different text representations; each digest byte
+            # becomes one feature in [-1, 1)
             embeddings = []
             
             # 1. Full text hash
-            full_hash = hashlib.md5(text.encode()).hexdigest()
-            embeddings.extend([(int(full_hash[i:i+2], 16) - 128) / 128.0 for i in range(0, min(len(full_hash), 64), 2)])
+            embeddings.extend([(byte - 128) / 128.0 for byte in _feature_digest(text.encode())])
             
             # 2. Word-based hash
-            word_hash = hashlib.md5(' '.join(words[:10]).encode()).hexdigest()
-            embeddings.extend([(int(word_hash[i:i+2], 16) - 128) / 128.0 for i in range(0, min(len(word_hash), 64), 2)])
+            embeddings.extend([(byte - 128) / 128.0 for byte in _feature_digest(' '.join(words[:10]).encode())])
             
             # 3. Length-based features
             embeddings.extend([
@@ -64,84 +197,35 @@ class AIService:
                 len(set(words)) / len(words) if words else 0.0  # Vocabulary diversity
             ])
             
-            # Pad to 768 dimensions (Qdrant expects 768)
-            while len(embeddings) < 768:
-                embeddings.append(0.0)
-            embeddings = embeddings[:768]
-            
-            return embeddings
+            # Pad to the stored vector size
+            return self._pad_embedding(embeddings)
         except Exception as e:
             logger.error(f"Enhanced embedding creation failed: {str(e)}")
             return self._create_hash_embeddings(text)
     
-    async def _create_all_minilm_embeddings(self, text: str) -> List[float]:
-        """Create embeddings using all-MiniLM-L6-v2 via Hugging Face API"""
-        try:
-            # Use Hugging Face Inference API for all-MiniLM-L6-v2
-            # This doesn't require local PyTorch installation
-            api_url = "https://api-inference.huggingface.co/models/sentence-transformers/all-MiniLM-L6-v2"
-            
-            headers = {
-                "Content-Type": "application/json",
-            }
-            
-            payload = {
-                "inputs": text,
-                "options": {
-                    "wait_for_model": True
-                }
-            }
-            
-            response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                embeddings = response.json()
-                # all-MiniLM-L6-v2 produces 384-dimensional embeddings
-                # We need to pad to 768 for Qdrant
-                if len(embeddings) == 384:
-                    # Pad to 768 dimensions
-                    embeddings.extend([0.0] * 384)
-                elif len(embeddings) < 768:
-                    embeddings.extend([0.0] * (768 - len(embeddings)))
-                else:
-                    embeddings = embeddings[:768]
-                
-                logger.info(f"Created embeddings using all-MiniLM-L6-v2: {len(embeddings)} dimensions")
-                return embeddings
-            else:
-                logger.warning(f"Hugging Face API failed: {response.status_code}")
-                # Fallback to enhanced embeddings instead of raising
-                logger.info("Falling back to enhanced hash embeddings")
-                return self._create_enhanced_embeddings(text)
-                
-        except Exception as e:
-            logger.error(f"all-MiniLM-L6-v2 embedding failed: {str(e)}")
-            # Fallback to enhanced embeddings
-            logger.info("Falling back to enhanced hash embeddings")
-            return self._create_enhanced_embeddings(text)
+    async def _create_all_minilm_embeddings(self, text: str, fallback: bool = True) -> Optional[List[float]]:
+        """
+        Create embeddings using all-MiniLM-L6-v2 via Hugging Face API, as a one-text batch.
+        On failure returns hash embeddings, or None when fallback is False.
+        """
+        embeddings = await self._create_all_minilm_embeddings_batch([text])
+        if embeddings is not None:
+            return embeddings[0]
+        
+        if not fallback:
+            return None
+        # Fallback to enhanced embeddings instead of raising
+        logger.info("Falling back to enhanced hash embeddings")
+        return self._create_enhanced_embeddings(text)
     
     def _create_hash_embeddings(self, text: str) -> List[float]:
         """Fallback hash-based embeddings"""
         try:
-            text_hash = hashlib.md5(text.encode()).hexdigest()
-            
-            # Convert hash to a list of floats (768 dimensions for Qdrant)
-            embedding = []
-            for i in range(0, len(text_hash), 2):
-                if len(embedding) >= 768:
-                    break
-                hex_pair = text_hash[i:i+2]
-                embedding.append((int(hex_pair, 16) - 128) / 128.0)
-            
-            # Pad or truncate to exactly 768 dimensions
-            while len(embedding) < 768:
-                embedding.append(0.0)
-            embedding = embedding[:768]
-            
-            return embedding
+            # One feature in [-1, 1) per digest byte, padded to the stored vector size
+            return self._pad_embedding([(byte - 128) / 128.0 for byte in _feature_digest(text.encode())])
         except Exception as e:
             logger.error(f"Hash embedding creation failed: {str(e)}")
-            return [random.random() - 0.5 for _ in range(768)]
+            return [random.random() - 0.5 for _ in range(EMBEDDING_DIMENSION)]
     
     async def generate_response(self, question: str, context: str) -> str:
         """Generate response using Google Gemini"""
@@ -172,7 +256,8 @@ Context from uploaded documents:
 Question: {question}"""
 
             logger.info(f"Generating response with context length: {len(context)}")
-            result = self.generation_model.generate_content(prompt)
+            # The SDK's async call, so the event loop keeps serving other requests meanwhile
+            result = await self.generation_model.generate_content_async(prompt)
             
             if result and result.text:
                 logger.info("Successfully generated response from Gemini")
@@ -214,6 +299,104 @@ Question: {question}"""
             logger.error(f"Fallback response creation failed: {str(e)}")
             return f"I found relevant documents but I'm having trouble processing them right now. Please try again later."
     
+    def _question_cache_key(self, question: str) -> bytes:
+        """
+        Cache key for a question's embedding. all-MiniLM-L6-v2 is uncased, so case and
+        whitespace don't change the embedding, and neither does much the punctuation
+        wrapping a question ("What is RAG?" vs "what is rag"). The model name is part
+        of the key so switching models never serves stale vectors
+        """
+        normalized = " ".join(question.lower().split()).strip(QUESTION_EDGE_PUNCTUATION)
+        return hashlib.sha256(f"{self.embedding_model_name}\0{normalized}".encode()).digest()
+    
     async def create_question_embeddings(self, question: str) -> List[float]:
-        """Create embeddings for a question"""
-        return await self.create_embeddings(question) 
\ No newline at end of file
+        """Create embeddings for a question, reusing the result for repeated questions"""
+        key = self._question_cache_key(question)
+        cached = self._question_embedding_cache.get(key)
+        if cached is not None:
+            self._question_embedding_hits += 1
+            return cached
+        self._question_embedding_misses += 1
+        logger.debug(
+            "Question embedding cache miss (%d hits, %d misses)",
+            self._question_embedding_hits, self._question_embedding_misses
+        )
+        
+        if self._question_queue is not None:
+            future = asyncio.get_running_loop().create_future()
+            await self._question_queue.put((question, future))
+            embeddings = await future
+        else:
+            embeddings = await self._create_all_minilm_embeddings(question, fallback=False)
+        if embeddings is None:
+            # Don't cache fallback embeddings; the next ask should retry the model
+            return self._create_enhanced_embeddings(question)
+        
+        self._question_embedding_cache[key] = embeddings
+        return embeddings 
+    
+    def start_batcher(self):
+        """Start the background task that embeds concurrent question cache misses together (call from app startup)"""
+        if self._question_batcher_task is not None:
+            return
+        self._question_queue = asyncio.Queue()
+        self._question_flush_slots = asyncio.Semaphore(QUESTION_BATCH_CONCURRENCY)
+        self._question_batcher_task = asyncio.create_task(self._run_batcher())
+    
+    async def stop_batcher(self):
+        """Stop the question batcher, embedding anything still queued"""
+        if self._question_batcher_task is None:
+            return
+        self._question_batcher_task.cancel()
+        try:
+            await self._question_batcher_task
+        except asyncio.CancelledError:
+            pass
+        queue, self._question_queue, self._question_batcher_task = self._question_queue, None, None
+        if self._question_flushes:
+            await asyncio.gather(*self._question_flushes, return_exceptions=True)
+        pending = []
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        if pending:
+            await self._flush_questions(pending)
+    
+    async def _run_batcher(self):
+        """Collect up to QUESTION_BATCH_SIZE questions, or whatever arrives within QUESTION_BATCH_WINDOW, per request"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._question_queue.get()]
+            deadline = loop.time() + QUESTION_BATCH_WINDOW
+            while len(batch) < QUESTION_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._question_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Embedded in its own task, so the next batch starts collecting right away
+            flush = asyncio.create_task(self._flush_questions_when_free(batch))
+            self._question_flushes.add(flush)
+            flush.add_done_callback(self._question_flushes.discard)
+    
+    async def _flush_questions_when_free(self, batch):
+        """Embed a batch once fewer than QUESTION_BATCH_CONCURRENCY batches are in flight"""
+        async with self._question_flush_slots:
+            await self._flush_questions(batch)
+    
+    async def _flush_questions(self, batch):
+        """Embed a batch of queued questions and resolve their waiters (None where embedding failed)"""
+        try:
+            if len(batch) == 1:
+                results = [await self._create_all_minilm_embeddings(batch[0][0], fallback=False)]
+            else:
+                results = await self._create_all_minilm_embeddings_batch([question for question, _ in batch])
+                if results is None:
+                    results = [None] * len(batch)
+        except Exception as e:
+            logger.error(f"Question batch embedding failed: {str(e)}")
+            results = [None] * len(batch)
+        for (_, future), embeddings in zip(batch, results):
+            if not future.done():
+                future.set_result(embeddings)
@@ -1,3 +1,5 @@
+import asyncio
+import multiprocessing
 import os
 import PyPDF2
 import pdfplumber
@@ -7,27 +9,73 @@ import logging
 import mammoth
 import docx
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Upload whitelist, in display order for error messages; membership checks use the frozensets
+SUPPORTED_EXTENSION_LIST = ('.pdf', '.docx', '.doc', '.txt', '.md', '.mdx', '.rtf')
+SUPPORTED_EXTENSIONS = frozenset(SUPPORTED_EXTENSION_LIST)
+TEXT_EXTENSIONS = frozenset({'.txt', '.md', '.mdx'})
+
+# Parsing (pdfplumber in particular) is CPU-bound and holds the GIL, so it runs in
+# worker processes; each upload is parsed in its own process, in parallel
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        # Spawned, not forked: by the time the first upload arrives the process already runs
+        # gRPC (Qdrant) and HTTP client threads, which a forked child would inherit mid-state
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=settings.EXTRACTION_WORKERS or None,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extraction_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died, so the next extraction starts a fresh one"""
+    global _extraction_pool
+    if _extraction_pool is pool:
+        _extraction_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_extraction_pool():
+    """Stop the extraction worker processes (call from app shutdown)"""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+def _extract_text_in_worker(file_path: str, file_extension: str) -> Dict[str, Any]:
+    """Process-pool entry point; reads the file itself so only the path is pickled"""
+    return DocumentProcessor().extract_text(file_path, None, file_extension)
+
 class DocumentProcessor:
     def __init__(self):
-        self.supported_extensions = ['.pdf', '.docx', '.doc', '.txt', '.md', '.mdx', '.rtf']
+        self.supported_extensions = SUPPORTED_EXTENSIONS
     
-    def extract_text(self, file_path: str, file_content: bytes, file_extension: str) -> Dict[str, Any]:
+    def extract_text(self, file_path: str, file_content: Optional[bytes], file_extension: str) -> Dict[str, Any]:
         """
-        Extract text from various document types
+        Extract text from various document types.
+        If file_content is None the file is read from file_path.
         """
         try:
             file_extension = file_extension.lower()
             
+            if file_content is None:
+                with open(file_path, "rb") as f:
+                    file_content = f.read()
+            
             if file_extension == '.pdf':
                 return self._extract_pdf(file_content)
             elif file_extension == '.docx':
                 return self._extract_docx(file_content)
             elif file_extension == '.doc':
                 return self._extract_doc(file_content)
-            elif file_extension in ['.txt', '.md', '.mdx']:
+            elif file_extension in TEXT_EXTENSIONS:
                 return self._extract_text_file(file_content, file_extension)
             elif file_extension == '.rtf':
                 return self._extract_rtf(file_content)
@@ -48,6 +96,25 @@ class DocumentProcessor:
                 "error": str(e)
             }
     
+    async def extract_text_async(self, file_path: str, file_extension: str) -> Dict[str, Any]:
+        """Extract text from the file at file_path in the extraction process pool"""
+        loop = asyncio.get_running_loop()
+        pool = _get_extraction_pool()
+        try:
+            return await loop.run_in_executor(
+                pool, _extract_text_in_worker, file_path, file_extension
+            )
+        except BrokenProcessPool as e:
+            # A dead worker (OOM kill, crash on a bad file) breaks the whole pool for good
+            logger.error(f"Extraction worker died: {str(e)}")
+            _discard_broken_pool(pool)
+            return {
+                "text": "",
+                "method": "error",
+                "success": False,
+                "error": str(e)
+            }
+    
     def _extract_pdf(self, file_content: bytes) -> Dict[str, Any]:
         """Extract text from PDF using multiple methods"""
         try:
@@ -158,7 +225,6 @@ class DocumentProcessor:
                 }
             
             # Method 2: Try mammoth for DOC files - convert bytes to BytesIO
-            import io
             file_buffer = io.BytesIO(file_content)
             try:
                 result = mammoth.extract_raw_text(file_buffer)
@@ -244,7 +310,6 @@ class DocumentProcessor:
         """Extract text from RTF files"""
         try:
             # Try mammoth for RTF - convert bytes to BytesIO
-            import io
             file_buffer = io.BytesIO(file_content)
             try:
                 result = mammoth.extract_raw_text(file_buffer)
@@ -327,7 +392,6 @@ class DocumentProcessor:
     
     def _clean_doc_text(self, text: str) -> str:
         """Clean DOC file text"""
-        import re
         
         # Remove binary data patterns
         text = re.sub(r'[A-Za-z0-9]{20,}[A-Za-z0-9\s]{50,}', '', text)  # Remove long binary sequences
@@ -407,7 +471,6 @@ class DocumentProcessor:
             text = file_content.decode('utf-8', errors='ignore')
             
             # Remove non-printable characters and clean up
-            import re
             text = re.sub(r'[^\x20-\x7E\n\r\t]', '', text)
             text = re.sub(r'\s+', ' ', text)
             
@@ -433,7 +496,6 @@ class DocumentProcessor:
     def _extract_advanced_patterns(self, file_content: bytes) -> str:
         """Advanced pattern extraction for binary DOC files"""
         try:
-            import re
             
             # Try multiple encodings
             encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
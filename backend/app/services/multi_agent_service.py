@@ -1,18 +1,25 @@
 import google.generativeai as genai
 from app.core.config import settings
 import logging
-from typing import List, Dict, Any, Optional
-import requests
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
+import httpx
 import json
-import asyncio
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Most document context a prompt carries; the query route builds context within this
+# budget and marks the cut with CONTEXT_TRUNCATED_NOTE
+MAX_CONTEXT_LENGTH = 15000
+CONTEXT_TRUNCATED_NOTE = "\n\n[Content truncated due to size limits...]"
+
 class AIService:
     """Simplified AI service for document RAG and web search functionality"""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        # Pooled client for web search; the app passes its shared client in
+        self.http_client = http_client or httpx.AsyncClient(timeout=10)
+        
         # Initialize Google Gemini only if API key is available
         self.google_api_available = bool(settings.GOOGLE_API_KEY)
         logger.info(f"Google API key available: {self.google_api_available}")
@@ -65,29 +72,11 @@ class AIService:
                 logger.warning("Google API not configured. Using fallback response.")
                 return self._create_fallback_response(context, question, web_search_results)
 
-            # Build prompt with context and web search results
-            system_prompt = self.assistant_config["system_prompt"]
-            
-            # Limit context size to avoid API limits
-            max_context_length = 15000
-            if len(context) > max_context_length:
-                context = context[:max_context_length] + "\n\n[Content truncated due to size limits...]"
-            
-            # Build the full prompt
-            prompt_parts = [system_prompt, "\nInstructions:", "- Answer based on the information provided in the context and web search results", "- Be concise but thorough", "- Cite which document the information comes from when possible", "- If you're not sure about something, acknowledge the uncertainty"]
-            
-            if context.strip():
-                prompt_parts.extend(["\nContext from uploaded documents:", context])
-            
-            if web_search_results:
-                prompt_parts.extend(["\nWeb search results:", web_search_results])
-            
-            prompt_parts.extend([f"\nQuestion: {question}"])
-            
-            full_prompt = "\n".join(prompt_parts)
+            full_prompt = self._build_prompt(question, context, web_search_results)
 
             logger.info("Generating response with AI model")
-            result = self.model.generate_content(full_prompt)
+            # The SDK's async call, so the event loop keeps serving other requests meanwhile
+            result = await self.model.generate_content_async(full_prompt)
             
             if result and result.text:
                 logger.info("Successfully generated response from AI model")
@@ -107,6 +96,83 @@ class AIService:
             logger.error(f"AI generation failed: {str(e)}")
             return self._create_fallback_response(context, question, web_search_results)
     
+    def _build_prompt(self, question: str, context: str, web_search_results: Optional[str] = None) -> str:
+        """
+        Build the generation prompt from the document context and optional web search results.
+        The context arrives already capped to MAX_CONTEXT_LENGTH by the query route
+        """
+        system_prompt = self.assistant_config["system_prompt"]
+        
+        # Build the full prompt
+        prompt_parts = [system_prompt, "\nInstructions:", "- Answer based on the information provided in the context and web search results", "- Be concise but thorough", "- Cite which document the information comes from when possible", "- If you're not sure about something, acknowledge the uncertainty"]
+        
+        if context.strip():
+            prompt_parts.extend(["\nContext from uploaded documents:", context])
+        
+        if web_search_results:
+            prompt_parts.extend(["\nWeb search results:", web_search_results])
+        
+        prompt_parts.extend([f"\nQuestion: {question}"])
+        
+        return "\n".join(prompt_parts)
+    
+    async def generate_response_stream(self, question: str, context: str, web_search_results: Optional[str] = None) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """
+        Stream the answer as text chunks while the model generates it.
+        The last item yielded is a dict shaped like generate_response's result, holding the full answer
+        """
+        if not self.google_api_available or not self.model:
+            logger.warning("Google API not configured. Using fallback response.")
+            fallback = self._create_fallback_response(context, question, web_search_results)
+            yield fallback["answer"]
+            yield fallback
+            return
+        
+        chunks: List[str] = []
+        try:
+            logger.info("Streaming response from AI model")
+            result = await self.model.generate_content_async(
+                self._build_prompt(question, context, web_search_results), stream=True
+            )
+            async for chunk in result:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            logger.error(f"AI streaming failed: {str(e)}")
+            if not chunks:
+                fallback = self._create_fallback_response(context, question, web_search_results)
+                yield fallback["answer"]
+                yield fallback
+                return
+            # Part of the answer has already gone out; finish with what there is, flagged as a fallback
+            yield {
+                "answer": "".join(chunks),
+                "assistant_name": self.assistant_config["name"],
+                "assistant_description": self.assistant_config["description"],
+                "model_used": str(self.model),
+                "web_search_used": web_search_results is not None,
+                "fallback_response": True
+            }
+            return
+        
+        if not chunks:
+            logger.warning("AI model returned empty response")
+            fallback = self._create_fallback_response(context, question, web_search_results)
+            yield fallback["answer"]
+            yield fallback
+            return
+        
+        logger.info("Successfully streamed response from AI model")
+        yield {
+            "answer": "".join(chunks),
+            "assistant_name": self.assistant_config["name"],
+            "assistant_description": self.assistant_config["description"],
+            "model_used": str(self.model),
+            "web_search_used": web_search_results is not None,
+            "success": True
+        }
+    
     def _create_fallback_response(self, context: str, question: str, web_search_results: Optional[str] = None) -> Dict[str, Any]:
         """Create a fallback response when Google API is not available"""
         try:
@@ -210,22 +276,18 @@ class AIService:
             
             logger.info(f"Searching via MCP server: {query}")
             
-            async with asyncio.timeout(10):  # 10 second timeout
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, 
-                    lambda: requests.post(url, json=payload, headers=headers, timeout=10)
-                )
+            response = await self.http_client.post(url, json=payload, headers=headers, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get("success") and data.get("results"):
                     results = data["results"]
-                    web_content = "Web search results:\n\n"
-                    
-                    for i, result in enumerate(results[:5], 1):
-                        web_content += f"{i}. {result.get('title', 'No title')}\n"
-                        web_content += f"   URL: {result.get('url', 'No URL')}\n"
-                        web_content += f"   {result.get('snippet', 'No description')}\n\n"
+                    web_content = "Web search results:\n\n" + "".join(
+                        f"{i}. {result.get('title', 'No title')}\n"
+                        f"   URL: {result.get('url', 'No URL')}\n"
+                        f"   {result.get('snippet', 'No description')}\n\n"
+                        for i, result in enumerate(results[:5], 1)
+                    )
                     
                     logger.info(f"MCP search successful, found {len(results)} results")
                     return web_content
@@ -236,7 +298,7 @@ class AIService:
                 logger.warning(f"MCP search failed with status {response.status_code}: {response.text}")
                 return None
                 
-        except asyncio.TimeoutError:
+        except httpx.TimeoutException:
             logger.error("MCP search timed out")
             return None
         except Exception as e:
@@ -257,11 +319,7 @@ class AIService:
             
             logger.info(f"Searching via DuckDuckGo API: {query}")
             
-            async with asyncio.timeout(10):  # 10 second timeout
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, 
-                    lambda: requests.get(url, params=params, timeout=10)
-                )
+            response = await self.http_client.get(url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -299,7 +357,7 @@ class AIService:
                 logger.warning(f"DuckDuckGo search failed with status {response.status_code}")
                 return None
                 
-        except asyncio.TimeoutError:
+        except httpx.TimeoutException:
             logger.error("DuckDuckGo search timed out")
             return None
         except Exception as e:
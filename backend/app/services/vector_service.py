@@ -1,24 +1,111 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, MatchAny,
+    OptimizersConfigDiff, Range, FilterSelector, PayloadSchemaType, SearchRequest,
+    IsEmptyCondition, PayloadField, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams
+)
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.services.ai_service import EMBEDDING_DIMENSION
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Upserts queued within this window (seconds), up to this many points, share one Qdrant request
+UPSERT_BATCH_SIZE = 32
+UPSERT_BATCH_WINDOW = 0.05
+
+# Bulk stores of at least this many points pause HNSW indexing while they upsert
+BULK_INDEXING_PAUSE_MIN = 16
+# Qdrant's default indexing_threshold, restored once no bulk import is running
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# Document vectors are also kept as int8 in RAM; searches over-fetch on the quantized
+# index and rescore the candidates with the original float vectors to keep recall
+DOCUMENT_QUANTIZATION = ScalarQuantization(
+    # quantile=0.99 ignores the extreme 1% of values when choosing the int8 range
+    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+)
+DOCUMENT_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Prompts keep at most this much document context, so stored text past it is never read;
+# the full text stays in Postgres
+PAYLOAD_TEXT_LIMIT = 15000
+# Payload fields search results carry back; the rest of the stored metadata stays in Qdrant
+DOCUMENT_RESULT_FIELDS = ["document_id", "filename", "text", "user_id", "session_id", "upload_date"]
+
+# Semantic response cache: answers to questions this similar (cosine) are reused
+RESPONSE_CACHE_COLLECTION = "response_cache"
+RESPONSE_CACHE_THRESHOLD = 0.95
+RESPONSE_CACHE_TTL = 3600
+# Expired cache entries are purged at most this often (seconds)
+RESPONSE_CACHE_PURGE_INTERVAL = 600
+
+def _has_document_quantization(quantization_config) -> bool:
+    """Whether a collection's quantization already matches DOCUMENT_QUANTIZATION"""
+    # Compared field by field: Qdrant reports quantile back as a float32, so it rarely
+    # equals 0.99 exactly, and optional fields it omits would fail an equality check
+    if not isinstance(quantization_config, ScalarQuantization):
+        return False
+    current, wanted = quantization_config.scalar, DOCUMENT_QUANTIZATION.scalar
+    return (
+        current.type == wanted.type
+        and bool(current.always_ram) == wanted.always_ram
+        and current.quantile is not None
+        and math.isclose(current.quantile, wanted.quantile, rel_tol=1e-6)
+    )
+
 class VectorService:
     def __init__(self):
+        self._upsert_queue: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+        self._indexing_lock = threading.Lock()
+        self._indexing_pauses = 0
+        self._last_response_cache_purge = 0.0
         try:
-            self.client = QdrantClient(
-                url=settings.QDRANT_URL,
-                api_key=settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None
-            )
+            self.client = self._connect()
             self.collection_name = "documents"
             self._ensure_collection_exists()
+            self._ensure_response_cache_exists()
         except Exception as e:
             logger.error(f"Qdrant connection failed: {str(e)}")
             self.client = None
     
+    def _connect(self) -> QdrantClient:
+        """
+        Create the process-wide Qdrant client, preferring gRPC over a kept-alive channel.
+        Falls back to HTTP when the gRPC port can't be reached
+        """
+        api_key = settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None
+        if settings.QDRANT_PREFER_GRPC:
+            try:
+                client = QdrantClient(
+                    url=settings.QDRANT_URL,
+                    api_key=api_key,
+                    prefer_grpc=True,
+                    grpc_port=settings.QDRANT_GRPC_PORT,
+                    timeout=settings.QDRANT_TIMEOUT,
+                    grpc_options={"grpc.keepalive_time_ms": 10000}
+                )
+                client.get_collections()
+                logger.info("Connected to Qdrant over gRPC")
+                return client
+            except Exception as e:
+                logger.warning(f"Qdrant gRPC connection failed, using HTTP: {str(e)}")
+        return QdrantClient(url=settings.QDRANT_URL, api_key=api_key, timeout=settings.QDRANT_TIMEOUT)
+    
     def _ensure_collection_exists(self):
         """Ensure the documents collection exists"""
         if not self.client:
@@ -29,45 +116,355 @@ class VectorService:
             collection_names = [col.name for col in collections.collections]
             
             if self.collection_name not in collection_names:
-                self.client.create_collection(
+                self._create_document_collection(self.collection_name)
+                logger.info(f"Created collection: {self.collection_name}")
+            else:
+                config = self.client.get_collection(self.collection_name).config
+                if config.params.vectors.size != EMBEDDING_DIMENSION:
+                    logger.error(
+                        f"Collection {self.collection_name} stores {config.params.vectors.size}-dimensional vectors, "
+                        f"not {EMBEDDING_DIMENSION}; run migrate_shrink_vectors.py"
+                    )
+                elif not _has_document_quantization(config.quantization_config):
+                    # Collections created before quantization (or with older settings) are updated in place
+                    self.client.update_collection(
+                        collection_name=self.collection_name,
+                        quantization_config=DOCUMENT_QUANTIZATION
+                    )
+                    logger.info(f"Updated int8 quantization on collection: {self.collection_name}")
+            
+            # Filtered searches use these; creating an index that already exists is a no-op
+            for field_name, field_schema in (
+                ("user_id", PayloadSchemaType.KEYWORD),
+                ("session_id", PayloadSchemaType.KEYWORD),
+                ("upload_ts", PayloadSchemaType.FLOAT),
+            ):
+                self.client.create_payload_index(
                     collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=768, distance=Distance.COSINE)
+                    field_name=field_name,
+                    field_schema=field_schema
                 )
-                logger.info(f"Created collection: {self.collection_name}")
         except Exception as e:
             logger.error(f"Collection creation failed: {str(e)}")
     
+    def _create_document_collection(self, collection_name: str):
+        """Create an empty document collection with the current vector size and quantization"""
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=EMBEDDING_DIMENSION, distance=Distance.COSINE),
+            quantization_config=DOCUMENT_QUANTIZATION
+        )
+    
+    def _ensure_response_cache_exists(self):
+        """Ensure the response cache collection and its filter indexes exist"""
+        try:
+            collections = self.client.get_collections()
+            exists = RESPONSE_CACHE_COLLECTION in [col.name for col in collections.collections]
+            if exists and self.client.get_collection(RESPONSE_CACHE_COLLECTION).config.params.vectors.size != EMBEDDING_DIMENSION:
+                # Cached answers are disposable, so a cache keyed by old-size vectors is just rebuilt
+                self.client.delete_collection(RESPONSE_CACHE_COLLECTION)
+                exists = False
+            if not exists:
+                self.client.create_collection(
+                    collection_name=RESPONSE_CACHE_COLLECTION,
+                    vectors_config=VectorParams(size=EMBEDDING_DIMENSION, distance=Distance.COSINE)
+                )
+                logger.info(f"Created collection: {RESPONSE_CACHE_COLLECTION}")
+            
+            # Lookups filter on these; creating an index that already exists is a no-op
+            for field_name, field_schema in (
+                ("user_id", PayloadSchemaType.KEYWORD),
+                ("session_id", PayloadSchemaType.KEYWORD),
+                ("use_web_search", PayloadSchemaType.BOOL),
+                ("cached_at", PayloadSchemaType.FLOAT),
+            ):
+                self.client.create_payload_index(
+                    collection_name=RESPONSE_CACHE_COLLECTION,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+        except Exception as e:
+            logger.error(f"Response cache collection creation failed: {str(e)}")
+    
+    def find_cached_response(self, query_embeddings: List[float], user_id: str, session_id: Optional[str], use_web_search: bool) -> Optional[Dict[str, Any]]:
+        """
+        Return a fresh cached response to a near-identical question in the same user/session
+        scope, generated with the same web search setting
+        """
+        if not self.client:
+            return None
+        
+        try:
+            hits = self.client.search(
+                collection_name=RESPONSE_CACHE_COLLECTION,
+                query_vector=query_embeddings,
+                query_filter=Filter(
+                    must=[
+                        FieldCondition(key="user_id", match=MatchValue(value=user_id)),
+                        FieldCondition(key="session_id", match=MatchValue(value=session_id or "")),
+                        FieldCondition(key="use_web_search", match=MatchValue(value=use_web_search)),
+                        FieldCondition(key="cached_at", range=Range(gte=time.time() - RESPONSE_CACHE_TTL)),
+                    ]
+                ),
+                limit=1,
+                score_threshold=RESPONSE_CACHE_THRESHOLD
+            )
+            if hits:
+                logger.info(f"Response cache hit (score={hits[0].score:.3f}) for user {user_id}")
+                return hits[0].payload["response"]
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {str(e)}")
+        return None
+    
+    def cache_response(self, query_embeddings: List[float], user_id: str, session_id: Optional[str], use_web_search: bool, response: Dict[str, Any]):
+        """Store a generated response for reuse by similar questions"""
+        if not self.client:
+            return
+        
+        try:
+            self.client.upsert(
+                collection_name=RESPONSE_CACHE_COLLECTION,
+                points=[PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=query_embeddings,
+                    payload={
+                        "user_id": user_id,
+                        "session_id": session_id or "",
+                        "use_web_search": use_web_search,
+                        "cached_at": time.time(),
+                        "response": response
+                    }
+                )],
+                wait=False
+            )
+        except Exception as e:
+            logger.warning(f"Response caching failed: {str(e)}")
+        self._purge_expired_responses()
+    
+    def invalidate_cached_responses(self, user_ids: List[str]):
+        """Drop cached responses for users whose documents changed"""
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not self.client or not user_ids:
+            return
+        
+        try:
+            self.client.delete(
+                collection_name=RESPONSE_CACHE_COLLECTION,
+                points_selector=FilterSelector(filter=Filter(
+                    must=[FieldCondition(key="user_id", match=MatchAny(any=user_ids))]
+                )),
+                wait=False
+            )
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed: {str(e)}")
+    
+    def clear_cached_responses(self):
+        """Drop every cached response, e.g. after documents were cleared for all users"""
+        if not self.client:
+            return
+        
+        try:
+            self.client.delete(
+                collection_name=RESPONSE_CACHE_COLLECTION,
+                points_selector=FilterSelector(filter=Filter()),
+                wait=False
+            )
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed: {str(e)}")
+    
+    def _purge_expired_responses(self):
+        """Delete expired cache entries, at most once per RESPONSE_CACHE_PURGE_INTERVAL"""
+        now = time.time()
+        if now - self._last_response_cache_purge < RESPONSE_CACHE_PURGE_INTERVAL:
+            return
+        self._last_response_cache_purge = now
+        try:
+            self.client.delete(
+                collection_name=RESPONSE_CACHE_COLLECTION,
+                points_selector=FilterSelector(filter=Filter(
+                    must=[FieldCondition(key="cached_at", range=Range(lt=now - RESPONSE_CACHE_TTL))]
+                )),
+                wait=False
+            )
+        except Exception as e:
+            logger.warning(f"Response cache purge failed: {str(e)}")
+    
+    def _build_point(self, document_id: str, text: str, embeddings: List[float], metadata: Dict[str, Any]) -> PointStruct:
+        """Build the Qdrant point for a document"""
+        # Convert document_id to a hash for Qdrant compatibility
+        point_id = int(hashlib.md5(document_id.encode()).hexdigest()[:8], 16)
+        payload = {
+            "text": text[:PAYLOAD_TEXT_LIMIT],
+            "document_id": document_id,
+            **metadata
+        }
+        # Numeric copy of upload_date so Qdrant can range-filter on it
+        if "upload_date" in metadata and "upload_ts" not in metadata:
+            payload["upload_ts"] = datetime.fromisoformat(metadata["upload_date"]).timestamp()
+        return PointStruct(
+            id=point_id,
+            vector=embeddings,
+            payload=payload
+        )
+    
     def store_document(self, document_id: str, text: str, embeddings: List[float], metadata: Dict[str, Any]):
         """Store document in vector database"""
         if not self.client:
             raise Exception("Qdrant client not available")
         
         try:
-            # Convert document_id to a hash for Qdrant compatibility
-            import hashlib
-            point_id = int(hashlib.md5(document_id.encode()).hexdigest()[:8], 16)
-            
-            point = PointStruct(
-                id=point_id,
-                vector=embeddings,
-                payload={
-                    "text": text,
-                    "document_id": document_id,
-                    **metadata
-                }
-            )
-            
             self.client.upsert(
                 collection_name=self.collection_name,
-                points=[point]
+                points=[self._build_point(document_id, text, embeddings, metadata)]
             )
             logger.info(f"Stored document {document_id} in vector database")
+            self.invalidate_cached_responses([metadata.get("user_id")])
         except Exception as e:
             logger.error(f"Vector storage failed: {str(e)}")
             raise
     
-    def search_documents(self, query_embeddings: List[float], limit: int = 3) -> List[Dict[str, Any]]:
-        """Search for similar documents (all users)"""
+    @contextmanager
+    def paused_indexing(self):
+        """
+        Turn off HNSW indexing for the duration of a bulk import and restore it after.
+        Reference-counted, since the collection is shared by concurrent imports.
+        
+        The count is per process, so best effort across server workers: one worker may
+        restore indexing while another's import is still running. That import then
+        indexes as it goes, which is slower but still correct
+        """
+        with self._indexing_lock:
+            self._indexing_pauses += 1
+            if self._indexing_pauses == 1:
+                self._set_indexing_threshold(0)
+        try:
+            yield
+        finally:
+            with self._indexing_lock:
+                self._indexing_pauses -= 1
+                if self._indexing_pauses == 0:
+                    self._set_indexing_threshold(DEFAULT_INDEXING_THRESHOLD)
+    
+    def _set_indexing_threshold(self, threshold: int):
+        """Best effort: a failed toggle only costs speed, never correctness"""
+        try:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                optimizer_config=OptimizersConfigDiff(indexing_threshold=threshold)
+            )
+            logger.info(f"Set indexing_threshold={threshold} on {self.collection_name}")
+        except Exception as e:
+            logger.warning(f"Failed to set indexing_threshold={threshold}: {str(e)}")
+    
+    def store_documents(self, documents: List[Dict[str, Any]]):
+        """Store several documents in vector database with a single upsert"""
+        if not self.client:
+            raise Exception("Qdrant client not available")
+        
+        # Large imports skip per-insert index maintenance and index once at the end
+        pause = self.paused_indexing() if len(documents) >= BULK_INDEXING_PAUSE_MIN else nullcontext()
+        try:
+            with pause:
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=[self._build_point(**document) for document in documents]
+                )
+            logger.info(f"Stored {len(documents)} documents in vector database")
+            self.invalidate_cached_responses({document["metadata"].get("user_id") for document in documents})
+        except Exception as e:
+            logger.error(f"Vector batch storage failed: {str(e)}")
+            raise
+    
+    async def store_document_async(self, document_id: str, text: str, embeddings: List[float], metadata: Dict[str, Any]):
+        """
+        Store document via the upsert batcher, so concurrent uploads share one
+        Qdrant request; falls back to a direct upsert when the batcher isn't running
+        """
+        if not self.client:
+            raise Exception("Qdrant client not available")
+        
+        if self._upsert_queue is None:
+            await run_in_threadpool(self.store_document, document_id, text, embeddings, metadata)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._upsert_queue.put((self._build_point(document_id, text, embeddings, metadata), future))
+        await future
+        logger.info(f"Stored document {document_id} in vector database")
+    
+    def start_batcher(self):
+        """Start the background task that drains queued upserts (call from app startup)"""
+        if not self.client or self._batcher_task is not None:
+            return
+        self._upsert_queue = asyncio.Queue()
+        self._batcher_task = asyncio.create_task(self._run_batcher())
+    
+    async def stop_batcher(self):
+        """Stop the upsert batcher, flushing anything still queued"""
+        if self._batcher_task is None:
+            return
+        # Not cancelled: the batcher flushes the batch it is collecting, then exits at this marker
+        await self._upsert_queue.put(None)
+        await self._batcher_task
+        queue, self._upsert_queue, self._batcher_task = self._upsert_queue, None, None
+        pending = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                pending.append(item)
+        if pending:
+            await self._flush_upserts(pending)
+    
+    async def _run_batcher(self):
+        """Collect up to UPSERT_BATCH_SIZE points, or whatever arrives within UPSERT_BATCH_WINDOW, per upsert"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._upsert_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + UPSERT_BATCH_WINDOW
+            while len(batch) < UPSERT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._upsert_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush_upserts(batch)
+            if stopping:
+                return
+    
+    async def _flush_upserts(self, batch):
+        """Upsert a batch of queued points and resolve their waiters"""
+        try:
+            await run_in_threadpool(
+                self.client.upsert,
+                collection_name=self.collection_name,
+                points=[point for point, _ in batch]
+            )
+            logger.info(f"Upserted batch of {len(batch)} points")
+            await run_in_threadpool(
+                self.invalidate_cached_responses, {point.payload.get("user_id") for point, _ in batch}
+            )
+        except Exception as e:
+            logger.error(f"Vector batch upsert failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+    
+    def search_documents(self, query_embeddings: List[float], limit: int = 3, query_filter: Optional[Filter] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents (all users unless query_filter narrows them)"""
         if not self.client:
             return []
         
@@ -75,6 +472,8 @@ class VectorService:
             search_result = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embeddings,
+                query_filter=query_filter,
+                search_params=DOCUMENT_SEARCH_PARAMS,
                 limit=limit
             )
             
@@ -111,24 +510,30 @@ class VectorService:
             )
             
             logger.info(f"🔍 Searching for documents with user_id: {user_id}, session_id: {session_id}")
-            logger.info(f"🔍 Query embeddings length: {len(query_embeddings)}")
+            logger.debug("🔍 Query embeddings length: %d", len(query_embeddings))
             
             search_result = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embeddings,
+                search_params=DOCUMENT_SEARCH_PARAMS,
+                with_payload=DOCUMENT_RESULT_FIELDS,
                 query_filter=session_filter,
                 limit=limit
             )
             
             logger.info(f"🔍 Session-based vector search returned {len(search_result)} results")
             
+            # Per-hit detail is debug-only; the guard skips building the arguments otherwise
+            debug = logger.isEnabledFor(logging.DEBUG)
             results = []
             for i, result in enumerate(search_result):
-                payload = result.payload
-                logger.info(f"🔍 Result {i+1}: score={result.score}, payload_keys={list(payload.keys())}")
-                logger.info(f"🔍 Result {i+1}: filename={payload.get('filename', 'Unknown')}")
-                logger.info(f"🔍 Result {i+1}: text_length={len(payload.get('text', ''))}")
-                logger.info(f"🔍 Result {i+1}: session_id={payload.get('session_id', 'Unknown')}")
+                if debug:
+                    payload = result.payload
+                    logger.debug(
+                        "🔍 Result %d: score=%s, filename=%s, text_length=%d, session_id=%s, payload_keys=%s",
+                        i + 1, result.score, payload.get('filename', 'Unknown'), len(payload.get('text', '')),
+                        payload.get('session_id', 'Unknown'), list(payload.keys())
+                    )
                 
                 results.append({
                     "score": result.score,
@@ -141,8 +546,8 @@ class VectorService:
             logger.error(f"Session-based vector search failed: {str(e)}")
             return []
     
-    def search_documents_with_user_filter(self, query_embeddings: List[float], user_id: str, limit: int = 3) -> List[Dict[str, Any]]:
-        """Search for similar documents for a specific user"""
+    def search_documents_with_user_filter(self, query_embeddings: List[float], user_id: str, limit: int = 3, score_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents for a specific user, dropping hits scored below score_threshold"""
         if not self.client:
             return []
         
@@ -158,23 +563,31 @@ class VectorService:
             )
             
             logger.info(f"🔍 Searching for documents with user_id: {user_id}")
-            logger.info(f"🔍 Query embeddings length: {len(query_embeddings)}")
+            logger.debug("🔍 Query embeddings length: %d", len(query_embeddings))
             
             search_result = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embeddings,
+                search_params=DOCUMENT_SEARCH_PARAMS,
+                with_payload=DOCUMENT_RESULT_FIELDS,
                 query_filter=user_filter,
-                limit=limit
+                limit=limit,
+                score_threshold=score_threshold
             )
             
             logger.info(f"🔍 Vector search returned {len(search_result)} results")
             
+            # Per-hit detail is debug-only; the guard skips building the arguments otherwise
+            debug = logger.isEnabledFor(logging.DEBUG)
             results = []
             for i, result in enumerate(search_result):
-                payload = result.payload
-                logger.info(f"🔍 Result {i+1}: score={result.score}, payload_keys={list(payload.keys())}")
-                logger.info(f"🔍 Result {i+1}: filename={payload.get('filename', 'Unknown')}")
-                logger.info(f"🔍 Result {i+1}: text_length={len(payload.get('text', ''))}")
+                if debug:
+                    payload = result.payload
+                    logger.debug(
+                        "🔍 Result %d: score=%s, filename=%s, text_length=%d, payload_keys=%s",
+                        i + 1, result.score, payload.get('filename', 'Unknown'),
+                        len(payload.get('text', '')), list(payload.keys())
+                    )
                 
                 results.append({
                     "score": result.score,
@@ -187,6 +600,66 @@ class VectorService:
             logger.error(f"Vector search with user filter failed: {str(e)}")
             return []
     
+    def search_documents_with_session_fallback(self, query_embeddings: List[float], user_id: str, session_id: str, limit: int = 3, uploaded_after: Optional[datetime] = None, score_threshold: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Search a user's session documents and all of their documents in one batched request.
+        
+        Returns (session_results, user_results) so the caller can fall back to the
+        user-wide hits without a second round trip when the session has none.
+        Session hits are limited to documents uploaded after uploaded_after, if given,
+        and Qdrant drops hits scored below score_threshold before returning them.
+        """
+        if not self.client:
+            return [], []
+        
+        try:
+            user_condition = FieldCondition(key="user_id", match=MatchValue(value=user_id))
+            session_conditions = [user_condition, FieldCondition(key="session_id", match=MatchValue(value=session_id))]
+            if uploaded_after:
+                # Points stored before upload_ts existed have no timestamp and are kept
+                session_conditions.append(Filter(should=[
+                    FieldCondition(key="upload_ts", range=Range(gt=uploaded_after.timestamp())),
+                    IsEmptyCondition(is_empty=PayloadField(key="upload_ts"))
+                ]))
+            
+            session_hits, user_hits = self.client.search_batch(
+                collection_name=self.collection_name,
+                requests=[
+                    SearchRequest(
+                        vector=query_embeddings,
+                        filter=Filter(must=session_conditions),
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        params=DOCUMENT_SEARCH_PARAMS,
+                        with_payload=DOCUMENT_RESULT_FIELDS
+                    ),
+                    SearchRequest(
+                        vector=query_embeddings,
+                        filter=Filter(must=[user_condition]),
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        params=DOCUMENT_SEARCH_PARAMS,
+                        with_payload=DOCUMENT_RESULT_FIELDS
+                    )
+                ]
+            )
+            
+            logger.info(f"🔍 Batched vector search returned {len(session_hits)} session and {len(user_hits)} user results")
+            
+            def to_results(hits):
+                return [
+                    {
+                        "score": result.score,
+                        "payload": result.payload,
+                        "id": result.id
+                    }
+                    for result in hits
+                ]
+            
+            return to_results(session_hits), to_results(user_hits)
+        except Exception as e:
+            logger.error(f"Batched session/user vector search failed: {str(e)}")
+            return [], []
+    
     def delete_document(self, document_id: str):
         """Delete document from vector database"""
         if not self.client:
@@ -194,7 +667,6 @@ class VectorService:
         
         try:
             # Convert document_id to a hash for Qdrant compatibility
-            import hashlib
             point_id = int(hashlib.md5(document_id.encode()).hexdigest()[:8], 16)
             
             self.client.delete(
@@ -229,6 +701,7 @@ class VectorService:
                     points_selector={"filter": user_filter}
                 )
                 logger.info(f"Cleared all documents for user {user_id} from vector database using filter")
+                self.invalidate_cached_responses([user_id])
                 return
             except Exception as filter_error:
                 logger.warning(f"User filter-based deletion failed: {str(filter_error)}")
@@ -255,6 +728,7 @@ class VectorService:
                         points_selector=points_to_delete
                     )
                     logger.info(f"Cleared {len(points_to_delete)} documents for user {user_id} from vector database using scroll")
+                    self.invalidate_cached_responses([user_id])
                 else:
                     logger.info(f"No documents found for user {user_id} in vector database")
                     
@@ -298,6 +772,90 @@ class VectorService:
         except Exception as e:
             logger.error(f"Failed to clear documents without upload_date: {str(e)}")
     
+    def backfill_upload_ts(self) -> int:
+        """
+        Add upload_ts to points stored before it existed, so the session time filter
+        applies to them. Returns the number of points updated
+        """
+        if not self.client:
+            return 0
+        
+        missing = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="upload_ts"))])
+        updated = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=missing,
+                limit=1000,
+                offset=offset,
+                with_payload=["upload_date"],
+                with_vectors=False
+            )
+            for point in points:
+                upload_date = point.payload.get("upload_date")
+                if not upload_date:
+                    continue  # Old-format points; clear_documents_without_upload_date handles these
+                self.client.set_payload(
+                    collection_name=self.collection_name,
+                    payload={"upload_ts": datetime.fromisoformat(upload_date).timestamp()},
+                    points=[point.id]
+                )
+                updated += 1
+            if offset is None:
+                break
+        
+        logger.info(f"Backfilled upload_ts on {updated} points")
+        return updated
+    
+    def shrink_vectors(self) -> int:
+        """
+        Rewrite the documents collection at EMBEDDING_DIMENSION, from one created when
+        vectors were zero-padded to 768. Only padding is cut, so cosine scores don't
+        change. Points are staged in a temporary collection while the original is
+        recreated. Returns the number of points rewritten
+        """
+        if not self.client:
+            return 0
+        if self.client.get_collection(self.collection_name).config.params.vectors.size == EMBEDDING_DIMENSION:
+            return 0
+        
+        staging_name = f"{self.collection_name}_{EMBEDDING_DIMENSION}"
+        self._create_document_collection(staging_name)
+        copied = self._copy_points(self.collection_name, staging_name)
+        self.client.delete_collection(self.collection_name)
+        self._ensure_collection_exists()
+        self._copy_points(staging_name, self.collection_name)
+        self.client.delete_collection(staging_name)
+        
+        logger.info(f"Rewrote {copied} points at {EMBEDDING_DIMENSION} dimensions")
+        return copied
+    
+    def _copy_points(self, source: str, target: str) -> int:
+        """Copy every point from source to target, cutting vectors to EMBEDDING_DIMENSION"""
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                self.client.upsert(
+                    collection_name=target,
+                    points=[
+                        PointStruct(id=point.id, vector=point.vector[:EMBEDDING_DIMENSION], payload=point.payload)
+                        for point in points
+                    ]
+                )
+                copied += len(points)
+            if offset is None:
+                break
+        return copied
+    
     def is_available(self) -> bool:
         """Check if Qdrant is available"""
         return self.client is not None
@@ -315,6 +873,7 @@ class VectorService:
                     points_selector={"filter": {}}
                 )
                 logger.info("Cleared all documents from vector database using filter")
+                self.clear_cached_responses()
                 return
             except Exception as filter_error:
                 logger.warning(f"Filter-based deletion failed: {str(filter_error)}")
@@ -337,6 +896,7 @@ class VectorService:
                             points_selector=point_ids
                         )
                         logger.info(f"Cleared {len(point_ids)} documents from vector database using scroll")
+                        self.clear_cached_responses()
                     else:
                         logger.info("No documents found in vector database")
                 else:
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Migration script to add status column to documents table
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app.core.database import SessionLocal
+
+def migrate_add_document_status():
+    """Add status column to documents table"""
+    
+    print("🔄 Starting migration: Adding status column to documents table...")
+    
+    db = SessionLocal()
+    try:
+        # Existing documents were processed inline, so they are all complete
+        print("📝 Adding status column...")
+        db.execute(text(
+            "ALTER TABLE documents ADD COLUMN IF NOT EXISTS status VARCHAR NOT NULL DEFAULT 'completed'"
+        ))
+        db.commit()
+        print("✅ Successfully added status column to documents table")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_add_document_status()
+    print("Migration completed!")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Migration script to add full-text search to the documents table.
+
+Adds the generated tsv column (to_tsvector of text_content, maintained by Postgres)
+and its GIN index, which the query keyword fallback searches. New databases get both
+from the SQLAlchemy models via create_all. Requires PostgreSQL 12+ for generated columns.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app.core.database import engine
+
+# Keep in sync with Document.tsv and ix_documents_tsv in app/core/database.py
+ADD_TSV_COLUMN = (
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', coalesce(text_content, ''))) STORED"
+)
+CREATE_TSV_INDEX = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_tsv "
+    "ON documents USING gin (tsv)"
+)
+
+def migrate_add_fulltext_search():
+    """Add the tsv column and its GIN index if missing"""
+    
+    print("🔄 Starting migration: Adding full-text search to documents...")
+    
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Building over every existing row can outlast the app's statement timeout
+        conn.execute(text("SET statement_timeout = 0"))
+        try:
+            print("📝 Adding tsv column (computes a vector for every existing document)...")
+            conn.execute(text(ADD_TSV_COLUMN))
+            print("✅ tsv column is in place")
+            
+            print("📝 Creating index ix_documents_tsv...")
+            conn.execute(text(CREATE_TSV_INDEX))
+            print("✅ Index ix_documents_tsv is in place")
+        except Exception as e:
+            print(f"❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_add_fulltext_search()
+    print("Migration completed!")
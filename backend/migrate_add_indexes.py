@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Migration script to add query indexes to existing databases.
+
+New databases get these indexes from the SQLAlchemy models via create_all;
+this script creates them on databases that were set up before they existed.
+Indexes are built with CREATE INDEX CONCURRENTLY so tables stay writable.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app.core.database import engine
+
+# (index name, DDL) pairs - keep in sync with __table_args__ in app/core/database.py.
+# ix_documents_tsv needs the tsv column first, so migrate_add_fulltext_search.py creates it
+INDEXES = [
+    (
+        "ix_chat_sessions_user_updated",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_user_updated "
+        "ON chat_sessions (user_id, updated_at, created_at)",
+    ),
+    (
+        "uq_session_user",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_session_user "
+        "ON chat_sessions (session_id, user_id)",
+    ),
+    (
+        "ix_messages_user_session_ts",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_user_session_ts "
+        "ON messages (user_id, session_id, timestamp)",
+    ),
+    (
+        "ix_documents_user_id",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_user_id "
+        "ON documents (user_id, id)",
+    ),
+    (
+        "ix_documents_user_session",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_user_session "
+        "ON documents (user_id, session_id, upload_date DESC)",
+    ),
+]
+
+def migrate_add_indexes():
+    """Create any missing indexes"""
+    
+    print("🔄 Starting migration: Adding indexes...")
+    
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Building over every existing row can outlast the app's statement timeout
+        conn.execute(text("SET statement_timeout = 0"))
+        for name, ddl in INDEXES:
+            try:
+                print(f"📝 Creating index {name}...")
+                conn.execute(text(ddl))
+                print(f"✅ Index {name} is in place")
+            except Exception as e:
+                print(f"❌ Failed to create index {name}: {str(e)}")
+                raise
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    migrate_add_indexes()
+    print("Migration completed!")
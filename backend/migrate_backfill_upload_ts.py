@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Migration script to add upload_ts to existing Qdrant points.
+
+Points stored before upload_ts existed only carry the ISO upload_date string, so the
+session time filter in vector search can't range over them. New points get it at ingest.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from app.services.vector_service import VectorService
+
+def migrate_backfill_upload_ts():
+    """Set upload_ts on every point that has an upload_date but no upload_ts"""
+    
+    print("🔄 Starting migration: Backfilling upload_ts in Qdrant...")
+    
+    vector_service = VectorService()
+    if not vector_service.is_available():
+        print("❌ Qdrant is not available")
+        sys.exit(1)
+    
+    updated = vector_service.backfill_upload_ts()
+    print(f"✅ Added upload_ts to {updated} points")
+
+if __name__ == "__main__":
+    print("Starting vector database migration...")
+    migrate_backfill_upload_ts()
+    print("Migration completed!")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Migration script to shrink stored document vectors from 768 to 384 dimensions.
+
+all-MiniLM-L6-v2 produces 384-dimensional embeddings, which used to be zero-padded to
+768 before they were stored. New vectors are stored unpadded, so an existing collection
+has to be rewritten at the new size; until then vector search falls back to full-text.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from app.services.vector_service import VectorService
+
+def migrate_shrink_vectors():
+    """Rewrite the documents collection with unpadded vectors"""
+    
+    print("🔄 Starting migration: Shrinking Qdrant document vectors...")
+    
+    vector_service = VectorService()
+    if not vector_service.is_available():
+        print("❌ Qdrant is not available")
+        sys.exit(1)
+    
+    rewritten = vector_service.shrink_vectors()
+    print(f"✅ Rewrote {rewritten} points")
+
+if __name__ == "__main__":
+    print("Starting vector database migration...")
+    migrate_shrink_vectors()
+    print("Migration completed!")
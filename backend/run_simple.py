@@ -1,11 +1,4 @@
-import uvicorn
-from app.main import app
+from app.main import main
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    main()
\ No newline at end of file
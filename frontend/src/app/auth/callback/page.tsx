@@ -7,7 +7,10 @@ export default function AuthCallbackPage() {
 
   useEffect(() => {
     const url = new URL(window.location.href);
-    const token = url.searchParams.get("token");
+    // The backend passes the token in the URL fragment so it never reaches server logs
+    const token =
+      new URLSearchParams(url.hash.slice(1)).get("token") ||
+      url.searchParams.get("token");
     if (token) {
       // Store in cookie for backend API to read on subsequent requests if needed
       // Note: HttpOnly cannot be set from JS; for simplicity we use a non-HttpOnly cookie here.